@@ -0,0 +1,126 @@
+"""
+Multi-process generation of big configurations
+"""
+import concurrent.futures
+import io
+import json
+import os
+from typing import List, Mapping, Sequence, Tuple, Union
+
+import click
+
+from card import setup
+from myhack import open_atomic
+
+NETWORK_TYPE = Tuple[str, Mapping]
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def split_in_shards(networks: Sequence[NETWORK_TYPE], shards: int, per_page: int = 1) -> List[Sequence[NETWORK_TYPE]]:
+    """
+    Split the networks in contiguous shards of (almost) the same number of pages, keeping their order
+    :param networks: the networks to split
+    :param shards: the number of shards wanted
+    :param per_page: number of cards per page ; only the last shard can end with a page which is not full
+    :return: the shards, in the same order as the networks
+    """
+    pages = -(-len(networks) // per_page)
+    shards = max(1, min(shards, pages))
+    size, remaining = divmod(pages, shards)
+    ret: List[Sequence[NETWORK_TYPE]] = []
+    start = 0
+    for i in range(shards):
+        end = start + (size + (1 if i < remaining else 0)) * per_page
+        ret.append(networks[start:end])
+        start = end
+    return ret
+
+
+def render_shard(networks: Sequence[NETWORK_TYPE]) -> bytes:
+    """Render a shard of networks as a standalone PDF (run by the workers)"""
+    from card import build_pdf
+    return bytes(build_pdf(networks).output())
+
+
+def shard_path(output: str, index: int, total: int) -> str:
+    """Return the path of the PDF of a shard, derived from the path of the whole output"""
+    root, ext = os.path.splitext(output)
+    return f'{root}-{index:0{len(str(total))}d}{ext or ".pdf"}'
+
+
+def merge_pdfs(parts: Sequence[bytes], output: str) -> None:
+    """
+    Concatenate PDF documents, in order, into a single one
+    :param parts: the PDF documents
+    :param output: path of the merged PDF ; `-` for the standard output
+    """
+    try:
+        import pypdf
+    except ImportError as e:
+        raise click.ClickException('Merging shards requires `pypdf` (install the `parallel` extra), or use '
+                                   '`--split`.') from e
+
+    writer = pypdf.PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    with open_atomic(output) as f:
+        if output == '-':  # pypdf needs to seek in its output, which a pipe cannot do
+            merged = io.BytesIO()
+            writer.write(merged)
+            f.write(merged.getbuffer())
+        else:
+            writer.write(f)
+
+
+def write_shards(shards: Sequence[Sequence[NETWORK_TYPE]], parts: Sequence[bytes], output: str,
+                 per_page: int = 1) -> None:
+    """
+    Write each shard in its own PDF, and the manifest listing them
+    :param shards: the networks of each shard
+    :param parts: the PDF of each shard
+    :param output: path of the whole output, from which shard paths are derived
+    :param per_page: number of cards per page
+    """
+    manifest = {
+        'output': os.path.basename(output),
+        'shards': [],
+    }
+    first_page = 1
+    for index, (networks, part) in enumerate(zip(shards, parts), start=1):
+        path = shard_path(output, index, len(parts))
+        with open(path, 'wb') as f:
+            f.write(part)
+        manifest['shards'].append({
+            'file': os.path.basename(path),
+            'first_page': first_page,
+            'networks': [name for name, _ in networks],
+        })
+        first_page += -(-len(networks) // per_page)
+
+    with open(os.path.splitext(output)[0] + MANIFEST_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def generate(networks: Sequence[NETWORK_TYPE], output: str, jobs: int, split: bool = False,
+             settings: Union[None, dict] = None) -> None:
+    """
+    Render the networks in a pool of processes, one shard per worker
+    :param networks: the networks to print, in order
+    :param output: path of the PDF to write
+    :param jobs: number of worker processes
+    :param split: if True, write one PDF per shard and a manifest instead of a single PDF
+    :param settings: the settings of the `main` group, to set up the workers
+    """
+    per_page = (settings or {}).get('per_page', 1)
+    shards = split_in_shards(networks, jobs, per_page)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(shards),
+            initializer=setup,
+            initargs=(settings,)
+    ) as executor:
+        parts = list(executor.map(render_shard, shards))
+
+    if split:
+        write_shards(shards, parts, output, per_page)
+    else:
+        merge_pdfs(parts, output)
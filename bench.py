@@ -0,0 +1,369 @@
+"""
+Benchmarks
+"""
+import io
+import json
+import platform
+import random
+import string
+import subprocess  # nosec
+import sys
+import time
+from typing import Any, Callable, Dict, List, Mapping, TextIO, Tuple, Union
+
+import click
+import jschon
+import tomlkit
+
+import myhack
+import qr
+from card import Renderer, add_wifi, get_qr_code_string, get_wifi_arguments
+from config import get_schema, get_validator
+from layout import PDF
+from paths import CURRENT_DIR
+
+SECURITIES: Tuple[str, ...] = ('Open', 'Enhanced Open', 'WEP', 'WPA', 'WPA2-PSK', 'WPA3-PSK')
+PASSWORD_CHARS = string.ascii_letters + string.digits + string.punctuation + ' '
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+STAGES_SIZES = (1, 100, 1000, 10000)
+STAGES: Tuple[str, ...] = ('toml_load', 'validation', 'qr_encoding', 'svg_abs_to_rel', 'add_wifi', 'output')
+RESULTS_FORMAT = 1
+# Commands which must not import the rendering dependencies
+STARTUP_COMMANDS: Tuple[Tuple[str, ...], ...] = (
+    ('--help',),
+    ('cli', '--help'),
+    ('generate', '--help'),
+    ('serve', '--help'),
+    ('export', '--help'),
+    ('watch', '--help'),
+    ('import', '--help'),
+)
+HEAVY_MODULES: Tuple[str, ...] = ('fpdf', 'qrcode', 'PIL', 'jschon', 'tomlkit', 'defusedxml', 'layout', 'card',
+                                  'numpy')
+# Run in a fresh interpreter: time the import of `main` and the command, then list the imported modules
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.argv = ['main.py'] + json.loads(sys.argv[1])
+import main
+try:
+    main.main()
+except SystemExit:
+    pass
+print(json.dumps({'time': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+# Payloads of every segment mode, and of many versions
+ENCODER_PAYLOADS: Tuple[str, ...] = (
+    '',
+    *(PASSWORD_CHARS[:n] for n in range(1, len(PASSWORD_CHARS) + 1)),
+    *('0123456789' * n for n in range(1, 40)),
+    *('WIFI:S:ÉCOLE 1234567890123456789012;T:WPA;P:' + 'A1 $%*+-./:' * n + ';;' for n in range(20)),
+    *('🛜' * n for n in range(1, 120, 7)),
+)
+STAGE_TIMES_TYPE = Dict[str, Dict[str, float]]  # stage -> {'wall': seconds, 'cpu': seconds}
+
+
+def synthetic_config(size: int, seed: int = 0) -> Dict[str, dict]:
+    """
+    Build a valid configuration with varied networks
+    :param size: number of networks
+    :param seed: seed of the random generator, to build the same configuration again
+    :return: the configuration, as `config.get_config_from_file` returns it
+    """
+    rand = random.Random(seed)
+    config = {}
+    for i in range(size):
+        wifi = {
+            'security': rand.choice(SECURITIES),
+        }
+        if rand.random() < .3:
+            wifi['ssid'] = f'SSID {i}'
+        if wifi['security'] not in ('Open', 'Enhanced Open'):
+            wifi['password'] = ''.join(rand.choice(PASSWORD_CHARS) for _ in range(rand.randint(8, 63)))
+        if rand.random() < .3:
+            wifi['hidden'] = rand.random() < .5
+        config[f'Network {i}'] = wifi
+    return config
+
+
+def timeit(f: Callable[[], object], repeat: int) -> float:
+    """Return the best time of `repeat` runs of f, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Stopwatch:
+    """Measure the wall and CPU times of stages, keeping the best ones over several runs"""
+
+    def __init__(self):
+        self.times: STAGE_TIMES_TYPE = {}
+
+    def measure(self, stage: str, f: Callable[[], Any]) -> Any:
+        """Run f, record its times as the ones of stage if they are the best so far, and return what f returns"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        ret = f()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        best = self.times.setdefault(stage, {'wall': wall, 'cpu': cpu})
+        best['wall'] = min(best['wall'], wall)
+        best['cpu'] = min(best['cpu'], cpu)
+        return ret
+
+
+def add_cards(pdf: PDF, networks: List[dict]) -> None:
+    """Draw the cards of networks, each one on its page"""
+    for network in networks:
+        with pdf.card():
+            add_wifi(pdf, **network)
+
+
+def run_stages(size: int, repeat: int) -> STAGE_TIMES_TYPE:
+    """
+    Generate a synthetic configuration, timing each stage separately
+    :param size: number of networks
+    :param repeat: keep the best time of this number of runs
+    :return: the times of each stage
+    """
+
+    toml_text = tomlkit.dumps(synthetic_config(size))
+    validator = get_validator()
+    stopwatch = Stopwatch()
+    for _ in range(repeat):
+        config = stopwatch.measure('toml_load', lambda: tomlkit.load(io.StringIO(toml_text)))
+        if not stopwatch.measure('validation', lambda: validator(config)):
+            raise click.ClickException('The synthetic configuration is not valid')
+
+        # Encoded QR codes are cached, so that the layout is timed without encoding them again
+        renderer = Renderer(lang='en', qr_cache=qr.MatrixCache(size))
+        networks = [get_wifi_arguments(name, wifi, renderer) for name, wifi in config.items()]
+        payloads = [
+            get_qr_code_string(network['ssid'], network['security'], network.get('password'), network.get('hidden', False))
+            for network in networks
+        ]
+        stopwatch.measure('qr_encoding', lambda: [qr.get_matrix(payload, renderer.qr_cache) for payload in payloads])
+
+        svgs = [
+            qr.make_qr_code(payload).make_image(fill_color="black", back_color="white").to_string()
+            for payload in payloads
+        ]
+        stopwatch.measure('svg_abs_to_rel', lambda: [myhack.svg_abs_to_rel(svg) for svg in svgs])
+
+        pdf = renderer.new_pdf()
+        stopwatch.measure('add_wifi', lambda: add_cards(pdf, networks))
+        stopwatch.measure('output', lambda: pdf.output())
+    return stopwatch.times
+
+
+def measure_startup(args: Tuple[str, ...]) -> Tuple[float, List[str]]:
+    """
+    Run a command of `main` in a fresh interpreter
+    :param args: the arguments of the command
+    :return: the time to import `main` and run the command, in seconds ; and the heavy modules it imported
+    """
+    process = subprocess.run(  # nosec
+        [sys.executable, '-c', STARTUP_SCRIPT, json.dumps(args)],
+        cwd=CURRENT_DIR,
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    result = json.loads(process.stdout.splitlines()[-1])
+    heavy = [module for module in HEAVY_MODULES if module in result['modules']]
+    return result['time'], heavy
+
+
+def load_results(results_IO: TextIO) -> Dict[str, STAGE_TIMES_TYPE]:
+    """Load the results written by the `stages` command"""
+    results = json.load(results_IO)
+    if results.get('format') != RESULTS_FORMAT:
+        raise click.ClickException(f'{results_IO.name}: unknown format of results')
+    return results['sizes']
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.option('--size', '-s', 'sizes', type=click.IntRange(min=1), multiple=True, default=DEFAULT_SIZES,
+              show_default=True, help='Number of networks of a configuration. Can be used multiple times.')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=3, show_default=True,
+              help='Keep the best time of this number of runs.')
+def validation(sizes: List[int], repeat: int):
+    """Compare the validation of the configuration by jschon and by the compiled validator."""
+    schema = get_schema()
+    validator = get_validator()
+
+    click.echo(f'{"networks":>10} {"jschon (s)":>12} {"compiled (s)":>14} {"speedup":>9}')
+    for size in sizes:
+        config = synthetic_config(size)
+        invalid = dict(config)
+        invalid['Invalid'] = {'security': 'WPA3-PSK', 'password': 'short'}
+        for document in (config, invalid):
+            expected = schema.evaluate(jschon.JSON(document)).valid
+            if validator(document) != expected:
+                raise click.ClickException(f'The compiled validator disagrees with jschon on {size} networks')
+
+        jschon_time = timeit(lambda: schema.evaluate(jschon.JSON(config)), repeat)
+        compiled_time = timeit(lambda: validator(config), repeat)
+        click.echo(f'{size:>10} {jschon_time:>12.5f} {compiled_time:>14.5f} {jschon_time / compiled_time:>8.0f}x')
+
+
+def make_reference_matrix(payload: str, error_correction: int, version: Union[None, int] = None,
+                          mask: Union[None, int] = None) -> qr.MATRIX_TYPE:
+    """Encode a payload with `qrcode`, as `qr.make_qr_code` does, but for the given parameters"""
+    import qrcode
+    code = qrcode.QRCode(border=0, error_correction=error_correction, version=version, mask_pattern=mask)
+    code.add_data(payload)
+    code.make(fit=True)
+    return code.get_matrix()
+
+
+def synthetic_payloads(size: int) -> List[str]:
+    """Return the payloads of the QR codes of the networks of a synthetic configuration"""
+    return [
+        get_qr_code_string(network['ssid'], network['security'], network.get('password'), network.get('hidden', False))
+        for network in (get_wifi_arguments(name, wifi, Renderer(lang='en'))
+                        for name, wifi in synthetic_config(size).items())
+    ]
+
+
+def check_encoder(payloads: List[str]) -> None:
+    """Check the `numpy` QR code encoder makes the same QR codes as `qrcode`, for all the parameters of QR codes"""
+    import qrcode.constants
+    import qrnumpy
+
+    for payload, matrix in zip(payloads, qrnumpy.encode_batch(payloads)):
+        if matrix != qr.make_qr_code(payload).get_matrix():
+            raise click.ClickException(f'The `numpy` encoder disagrees with `qrcode` on {payload!r}')
+
+    rand = random.Random(0)
+    for error_correction in (qrcode.constants.ERROR_CORRECT_L, qrcode.constants.ERROR_CORRECT_M,
+                             qrcode.constants.ERROR_CORRECT_Q, qrcode.constants.ERROR_CORRECT_H):
+        for mask in (None,) + tuple(range(8)):
+            for version in (None, rand.randint(1, 9), rand.randint(10, 26), rand.randint(27, 40)):
+                sample = rand.sample(payloads, 3)
+                expected = [make_reference_matrix(payload, error_correction, version, mask) for payload in sample]
+                if qrnumpy.encode_batch(sample, error_correction, version, mask) != expected:
+                    raise click.ClickException(f'The `numpy` encoder disagrees with `qrcode` on {sample!r}, with error '
+                                               f'correction {error_correction}, version {version} and mask {mask}')
+
+
+@main.command('check-encoders')
+@click.option('--size', '-s', type=click.IntRange(min=1), default=DEFAULT_SIZES[1], show_default=True,
+              help='Number of networks of the configuration whose QR codes are also checked.')
+def check_encoders(size: int):
+    """Check the QR code encoders make the same QR codes, without timing them."""
+    payloads = list(ENCODER_PAYLOADS) + synthetic_payloads(size)
+    check_encoder(payloads)
+    click.echo(f'{len(payloads)} QR codes checked.')
+
+
+@main.command()
+@click.option('--size', '-s', 'sizes', type=click.IntRange(min=1), multiple=True, default=DEFAULT_SIZES[:3],
+              show_default=True, help='Number of networks of a configuration. Can be used multiple times.')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=3, show_default=True,
+              help='Keep the best time of this number of runs.')
+def encoders(sizes: List[int], repeat: int):
+    """Check the QR code encoders make the same QR codes, and compare their speed."""
+    payloads = synthetic_payloads(max(sizes))
+    check_encoder(list(ENCODER_PAYLOADS) + payloads)
+
+    click.echo(f'{"networks":>10} {"qrcode (s)":>12} {"numpy (s)":>11} {"speedup":>9}')
+    for size in sizes:
+        times = {
+            encoder: timeit(lambda: qr.encode(payloads[:size], encoder), repeat)
+            for encoder in qr.ENCODERS
+        }
+        click.echo(f'{size:>10} {times["qrcode"]:>12.5f} {times["numpy"]:>11.5f} '
+                   f'{times["qrcode"] / times["numpy"]:>8.1f}x')
+
+
+@main.command()
+@click.option('--size', '-s', 'sizes', type=click.IntRange(min=1), multiple=True, default=STAGES_SIZES,
+              show_default=True, help='Number of networks of a configuration. Can be used multiple times.')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Keep the best time of this number of runs.')
+@click.option('--output', '-o', type=click.File(mode='w', encoding='utf-8'), default='-',
+              help='Where to write the results, as JSON. By default, the standard output.')
+def stages(sizes: List[int], repeat: int, output: TextIO):
+    """Time each stage of the generation of synthetic configurations."""
+
+    results: Dict[str, Any] = {
+        'format': RESULTS_FORMAT,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'sizes': {},
+    }
+    for size in sizes:
+        times = run_stages(size, repeat)
+        results['sizes'][str(size)] = times
+        click.echo(f'{size:>6} networks: ' + ', '.join(f'{stage} {times[stage]["wall"]:.4f}s' for stage in STAGES),
+                   err=True)
+
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+@main.command()
+@click.option('--budget', '-b', type=click.FloatRange(min=0), default=100, show_default=True,
+              help='Fail if importing `main` and running a command takes more than this number of milliseconds.')
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=5, show_default=True,
+              help='Keep the best time of this number of runs.')
+def startup(budget: float, repeat: int):
+    """Check `--help` stays quick: it must not import the rendering dependencies, and fit in a time budget."""
+    failures = []
+    click.echo(f'{"command":<24} {"time (ms)":>10}  heavy modules')
+    for args in STARTUP_COMMANDS:
+        runs = [measure_startup(args) for _ in range(repeat)]
+        best = min(t for t, _ in runs) * 1000
+        heavy = sorted({module for _, modules in runs for module in modules})
+        click.echo(f'{" ".join(args):<24} {best:>10.1f}  {", ".join(heavy) or "-"}')
+        if heavy:
+            failures.append(f'`{" ".join(args)}` imports {", ".join(heavy)}')
+        if best > budget:
+            failures.append(f'`{" ".join(args)}` takes {best:.1f} ms')
+
+    if failures:
+        raise click.ClickException('Startup budget exceeded: ' + '; '.join(failures))
+
+
+@main.command()
+@click.argument('baseline', type=click.File(mode='r', encoding='utf-8'))
+@click.argument('current', type=click.File(mode='r', encoding='utf-8'))
+@click.option('--threshold', '-t', type=click.FloatRange(min=0), default=.1, show_default=True,
+              help='Fail if a stage is slower than in the baseline by more than this ratio.')
+@click.option('--min-time', type=click.FloatRange(min=0), default=.001, show_default=True,
+              help='Ignore the stages whose baseline time is below this number of seconds (too noisy).')
+@click.option('--metric', type=click.Choice(('wall', 'cpu')), default='wall', show_default=True,
+              help='Which time to compare.')
+def compare(baseline: TextIO, current: TextIO, threshold: float, min_time: float, metric: str):
+    """Compare the results of 2 runs of the `stages` command, and fail if there is a regression."""
+    before: Mapping[str, STAGE_TIMES_TYPE] = load_results(baseline)
+    after: Mapping[str, STAGE_TIMES_TYPE] = load_results(current)
+
+    regressions = []
+    click.echo(f'{"networks":>10} {"stage":<16} {"baseline (s)":>13} {"current (s)":>12} {"ratio":>7}')
+    for size in sorted(before.keys() & after.keys(), key=int):
+        for stage in STAGES:
+            if stage not in before[size] or stage not in after[size]:
+                continue
+            old, new = before[size][stage][metric], after[size][stage][metric]
+            ratio = new / old if old else float('inf')
+            mark = ''
+            if old >= min_time and ratio > 1 + threshold:
+                regressions.append(f'{stage} on {size} networks')
+                mark = ' !'
+            click.echo(f'{size:>10} {stage:<16} {old:>13.5f} {new:>12.5f} {ratio:>6.2f}x{mark}')
+
+    if regressions:
+        raise click.ClickException(f'Regressions beyond {threshold:.0%}: ' + ', '.join(regressions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,498 @@
+"""
+Rendering of the cards of Wi-Fi networks
+"""
+import gettext
+import io
+import itertools
+from typing import Union, BinaryIO, Dict, Iterable, Iterator, Tuple, Mapping, List, Sequence
+
+import click
+import fpdf
+import fpdf.drawing
+
+import pagecache
+import qr
+from colors import Colors
+from i18n import DEFAULT_LANGUAGE, get_catalog
+from layout import MARGIN, INTERLINE_SPACING, FONTS, ICONS, IMPOSITIONS, PDF, CHAR_SPEC_TYPE, CHAR_TABLE_TYPE, \
+    UnsupportedCharError, get_char_specs, get_char_table, fit_text
+from wifi import WifiSecurity
+
+QR_BATCH_SIZE = 64  # Networks whose QR codes are encoded at once, by an encoder of batches
+
+
+def get_language_catalog(lang: str) -> gettext.NullTranslations:
+    """Return the translations of a language (see `i18n.get_catalog`), or tell the user there are none"""
+    try:
+        return get_catalog(lang)
+    except LookupError as e:
+        raise click.ClickException(f'Language `{lang}` is not translated (yet).') from e
+
+
+class Renderer:
+    """
+    Render the cards of networks with its own settings: color set, language, QR codes, cards per page and page cache.
+    Nothing global is read or changed, so renderers with different settings can be used at once. A renderer can also
+    be kept and shared by threads: each rendering has its own document, and the caches can be shared.
+    Whatever the renderer, fonts are loaded only once per process (see `fontmetrics`).
+    """
+
+    def __init__(self, colors: Union[None, str] = None, lang: str = DEFAULT_LANGUAGE,
+                 qr_renderer: str = qr.DEFAULT_RENDERER, qr_cache: Union[None, qr.MatrixCache] = None,
+                 per_page: int = 1, cache_dir: Union[None, str] = None, keep_pages: bool = False):
+        """
+        :param colors: name of the color set (see `Colors`) ; the default one if None
+        :param lang: language of the document, and of the networks which do not set theirs
+        :param qr_renderer: how to draw QR codes ; one of `qr.RENDERERS`
+        :param qr_cache: the cache of encoded QR codes ; a new one if None
+        :param per_page: number of cards per page ; a key of `layout.IMPOSITIONS`
+        :param cache_dir: where to keep the cards, to render again only the networks which changed (see `pagecache`)
+        :param keep_pages: also keep the cards in memory, for a renderer rendering the same networks again and again
+        """
+        if qr_renderer not in qr.RENDERERS:
+            raise ValueError(f'Unknown QR code renderer: {qr_renderer}')
+        if per_page not in IMPOSITIONS:
+            raise ValueError(f'Unsupported number of cards per page: {per_page}')
+
+        self.colors = Colors.from_string(colors) if colors else Colors.default()
+        self.char_table = get_char_table(self.colors)
+        self.language = lang
+        self.translations = get_language_catalog(lang)
+        self.qr_renderer = qr_renderer
+        self.qr_cache = qr.MatrixCache() if qr_cache is None else qr_cache
+        self.per_page = per_page
+        self.page_cache = None
+        if cache_dir is not None or keep_pages:
+            page_cache_type = pagecache.MemoryPageCache if keep_pages else pagecache.PageCache
+            self.page_cache = page_cache_type(cache_dir, {
+                'colors': colors,
+                'lang': lang,
+                'qr_renderer': qr_renderer,
+                'per_page': per_page,
+            })
+
+    @classmethod
+    def from_settings(cls, settings: Mapping) -> 'Renderer':
+        """Create the renderer of the settings of the `main` group (and of the command)"""
+        return cls(
+            settings['colors'],
+            settings['lang'],
+            settings['qr_renderer'] or qr.DEFAULT_RENDERER,
+            qr.MatrixCache(settings['qr_cache_size'], settings['qr_cache_dir'],
+                           settings.get('qr_encoder') or qr.DEFAULT_ENCODER),
+            settings.get('per_page', 1),
+            settings.get('cache_dir'),
+            settings.get('keep_pages', False),
+        )
+
+    def new_pdf(self, stream: Union[None, BinaryIO] = None) -> PDF:
+        """
+        Create an empty document
+        :param stream: where to write the pages as they are finished, if any
+        """
+        pdf = PDF('P', 'pt', 'A4', per_page=self.per_page, stream=stream)
+        pdf.set_margins(*MARGIN)
+
+        # Setup metadata
+        pdf.set_creator('gitlab.com/ajabep/wifi-print-readable-passwd')
+        pdf.set_display_mode('fullpage')
+        _ = self.translations.gettext
+        pdf.set_title(_('Wi-Fi QRCode'))
+        return pdf
+
+    def add_network(self, pdf: PDF, wifi_name: str, wifi_characteristics: Mapping) -> None:
+        """Draw the card of a network in the next cell of a document, copying it from the page cache if it can"""
+        with pdf.card():
+            if self.page_cache is None:
+                add_wifi(pdf, **get_wifi_arguments(wifi_name, wifi_characteristics, self))
+                return
+
+            key = self.page_cache.get_key(wifi_name, wifi_characteristics)
+            snapshot = self.page_cache.load(key)
+            if snapshot is None or not pdf.add_card_snapshot(snapshot):
+                add_wifi(pdf, **get_wifi_arguments(wifi_name, wifi_characteristics, self))
+                snapshot = pdf.snapshot_card()
+                if snapshot is not None:
+                    self.page_cache.store(key, snapshot)
+
+    def prefetch_qr_codes(self, networks: Sequence[Tuple[str, Mapping]]) -> None:
+        """
+        Encode at once the QR codes of networks about to be drawn, if the encoder of the QR code cache encodes batches
+        (see `qr.MatrixCache.prefetch`). Not with a page cache: most of the cards would not need their QR code.
+        """
+        if self.qr_cache.encoder != 'numpy' or self.qr_renderer != 'vector' or self.page_cache is not None:
+            return
+        self.qr_cache.prefetch([
+            get_qr_code_string(wifi.get('ssid', name), WifiSecurity.from_string(wifi['security']), wifi.get('password'),
+                               wifi.get('hidden', False))
+            for name, wifi in networks
+        ])
+
+    def render(self, networks: Iterable[Tuple[str, Mapping]]) -> bytes:
+        """
+        Render the PDF of some networks
+        :param networks: pairs of (name, characteristics) of the networks to print, in order
+        :return: the PDF
+        """
+        return bytes(build_pdf(networks, renderer=self).output())
+
+    def render_iter(self, networks: Iterable[Tuple[str, Mapping]]) -> Iterator[bytes]:
+        """
+        Render the PDF of some networks, by chunks yielded as soon as pages are finished: memory does not grow with the
+        number of networks (see `layout.PDF`)
+        :param networks: pairs of (name, characteristics) of the networks to print, in order
+        :return: the chunks of the PDF
+        """
+        buffer = io.BytesIO()
+        pdf = self.new_pdf(buffer)
+        for wifi_name, wifi_characteristics in networks:
+            self.add_network(pdf, wifi_name, wifi_characteristics)
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        pdf.output(buffer)
+        yield buffer.getvalue()
+
+
+RENDERER: Union[None, Renderer] = None  # The one used when none is given (see `setup`)
+
+
+def get_renderer() -> Renderer:
+    """Return the renderer installed by `setup` ; one with the default settings if none is"""
+    global RENDERER
+    if RENDERER is None:
+        RENDERER = Renderer()
+    return RENDERER
+
+
+def setup(settings: Union[None, dict]) -> None:
+    """
+    Install the renderer of the settings, used by the functions of this module when they are given none
+    :param settings: the settings of the `main` group ; if None, nothing is installed
+    """
+    global RENDERER
+    if settings is None:
+        return
+
+    RENDERER = Renderer.from_settings(settings)
+
+
+def build_pdf(networks: Iterable[Tuple[str, Mapping]], stream: Union[None, BinaryIO] = None,
+              renderer: Union[None, Renderer] = None) -> fpdf.FPDF:
+    """
+    Build the PDF of some networks
+    :param networks: pairs of (name, characteristics) of the networks to print, in order
+    :param stream: where to write the pages as they are finished, if any
+    :param renderer: the renderer to use ; the installed one by default (see `get_renderer`)
+    :return: the PDF, ready to be written (in the stream, if any)
+    """
+    renderer = renderer or get_renderer()
+    pdf = renderer.new_pdf(stream)
+    wifi_characteristics: Dict[str, str]
+    wifi_name: str
+    networks = iter(networks)
+    while True:  # By batches, so that networks are still read as they are drawn
+        batch = list(itertools.islice(networks, QR_BATCH_SIZE))
+        if not batch:
+            return pdf
+        renderer.prefetch_qr_codes(batch)
+        for wifi_name, wifi_characteristics in batch:
+            renderer.add_network(pdf, wifi_name, wifi_characteristics)
+
+
+def get_wifi_arguments(wifi_name: str, wifi_characteristics: Mapping, renderer: Union[None, Renderer] = None) -> dict:
+    """Turn a network of the configuration into the arguments of `add_wifi`"""
+    renderer = renderer or get_renderer()
+    wifi_characteristics = dict(**wifi_characteristics)
+    wifi_characteristics.setdefault('ssid', wifi_name)
+    language = wifi_characteristics.pop('language', None)
+    wifi_characteristics['translations'] = renderer.translations if language is None else \
+        get_language_catalog(language)
+    wifi_characteristics['security'] = WifiSecurity.from_string(wifi_characteristics['security'])
+    wifi_characteristics['renderer'] = renderer
+    return wifi_characteristics
+
+
+def escape(clear: str):
+    """Escape a string to be integrated into the string to generate the QRCode."""
+    return clear \
+        .replace('\\/', "\\\\") \
+        .replace(':', "\\:") \
+        .replace(';', "\\;") \
+        .replace(',', "\\,") \
+        .replace('\"', "\\\"")
+
+
+def get_qr_code_string(ssid: str, security: WifiSecurity, password: Union[None, str] = None,
+                       hidden: bool = False) -> str:
+    """Generate the string to encode as a QRCode to be authenticated to the Wi-Fi."""
+    if security.is_open:
+        sec = 'none'
+    elif security == WifiSecurity.WEP:
+        sec = 'WEP'
+    elif security in [WifiSecurity.WPA, WifiSecurity.WPA2PSK]:
+        sec = 'WPA'
+    elif security == WifiSecurity.WPA3PSK:
+        sec = 'SAE'
+    else:
+        raise NotImplementedError('Crap! A case which is not expected!')
+
+    e_ssid = escape(ssid)
+
+    if password is None:
+        e_passwd = "None"  # nosec
+    else:
+        e_passwd = escape(password)
+
+    hidden_str = ''
+    if hidden:
+        hidden_str = 'H:true;'
+
+    return f"WIFI:S:{e_ssid};T:{sec};P:{e_passwd};{hidden_str}"
+
+
+def add_qr_code(pdf: fpdf.FPDF, ssid: str, security: WifiSecurity, password: Union[None, str] = None,
+                hidden: bool = False, renderer: Union[None, Renderer] = None):
+    """Add a QRCode to a PDF, drawn as the renderer says (the installed one by default)."""
+    renderer = renderer or get_renderer()
+    payload = get_qr_code_string(ssid, security, password, hidden)
+    pdf.set_fill_color(0, 0, 0)
+    width = pdf.w_pt - MARGIN[0] - MARGIN[2]
+    if renderer.qr_renderer == 'svg':
+        qr.draw_svg(pdf, payload, MARGIN[0], MARGIN[1] * -1)  # * -1 == it pissed me off ; idk why 😠
+    else:
+        # Same place as the SVG renderer: centered in the page viewport, then moved up by the top margin
+        qr.draw_matrix(pdf, qr.get_matrix(payload, renderer.qr_cache), MARGIN[0], (pdf.eph - width) / 2 - MARGIN[1], width)
+    pdf.set_y(pdf.get_y() + width + MARGIN[1] + INTERLINE_SPACING)  # width == height : QR Code are square
+
+
+def add_wifi(pdf: fpdf.FPDF, ssid: str, security: WifiSecurity, password: Union[None, str] = None,
+             hidden: bool = False, translations: Union[None, gettext.NullTranslations] = None,
+             renderer: Union[None, Renderer] = None):
+    """
+    Draw the card of a Wi-Fi in a PDF, in its current card (see `layout.PDF.card`).
+    The card is drawn with the settings of `renderer` (the installed one by default), and its texts are translated
+    with `translations` (the ones of the language of the renderer by default).
+    """
+    renderer = renderer or get_renderer()
+    translations = translations or renderer.translations
+    _ = translations.gettext
+    add_qr_code(pdf, ssid, security, password, hidden, renderer)
+
+    main_font_fam = FONTS['main']['fam']
+    main_font_size = FONTS['main']['size']
+    about_font_size = FONTS['about']['size']
+    icon_font_fam = FONTS['icons']['fam']
+    icon_font_size = FONTS['icons']['size']
+    pdf.set_text_color(0, 0, 0)
+
+    pdf.set_font(icon_font_fam, size=icon_font_size)
+    pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['wifi'])
+    pdf.set_font(main_font_fam, size=main_font_size)
+    pdf.write(main_font_size + INTERLINE_SPACING, ' ' + ssid)
+    pdf.ln()
+
+    if security.is_open:
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_font(icon_font_fam, size=icon_font_size)
+        pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['no_passwd'])
+        pdf.set_font(main_font_fam, size=main_font_size)
+        pdf.write(main_font_size + INTERLINE_SPACING, ' ')
+        pdf.write(main_font_size + INTERLINE_SPACING, _('No password'))
+    else:
+        pdf.set_font(icon_font_fam, size=icon_font_size)
+        pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['passwd'])
+        pdf.set_font(main_font_fam, size=main_font_size)
+        pdf.write(main_font_size + INTERLINE_SPACING, ' ')
+        write_password(pdf, password, renderer.char_table)
+
+    if hidden:
+        mid_page = pdf.w / 2
+        rect_width = mid_page - INTERLINE_SPACING - (MARGIN[0] + MARGIN[2]) / 2
+        r1_content_height = main_font_size + about_font_size + INTERLINE_SPACING
+        r2_content_height = about_font_size * 3 + INTERLINE_SPACING * 2
+        rect_content_height = max(r1_content_height, r2_content_height)
+        rect_height = rect_content_height + INTERLINE_SPACING * 2
+
+        margin_bottom = MARGIN[1]
+        rect_org_y = pdf.h - margin_bottom - rect_height
+
+        r1 = {
+            'org': fpdf.drawing.Point(MARGIN[0], rect_org_y),
+            'size': fpdf.drawing.Point(rect_width, rect_height),
+        }
+        r2 = {
+            'org': fpdf.drawing.Point(rect_width + MARGIN[0] + INTERLINE_SPACING * 2, rect_org_y),
+            'size': fpdf.drawing.Point(rect_width, rect_height),
+        }
+        # Only the security changes from a hidden network to another of the same language: the rest is drawn once,
+        # then reused
+        pdf.draw_form(f"hidden-{translations.info().get('language', '')}",
+                      lambda: add_hidden_frame(pdf, r1, r2, rect_content_height, translations))
+
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_font(icon_font_fam, size=rect_content_height)
+        r1_icon_width = pdf.get_string_width(ICONS['security'])
+        pdf.set_font(main_font_fam)
+        text_max_size(
+            pdf,
+            rect_width - INTERLINE_SPACING * 3 - r1_icon_width,
+            main_font_size,
+            r1['org'].x + INTERLINE_SPACING * 2 + r1_icon_width,
+            rect_org_y + INTERLINE_SPACING + about_font_size + main_font_size,
+            _("None") if security == WifiSecurity.OPEN else security.value
+        )
+
+
+def add_hidden_frame(pdf: fpdf.FPDF, r1: Dict[str, fpdf.drawing.Point], r2: Dict[str, fpdf.drawing.Point],
+                     rect_content_height: float, translations: gettext.NullTranslations):
+    """
+    Draw the frames telling that a network is hidden, with their icons and titles (but the security of the network).
+    :param pdf: the FPDF object in which draw
+    :param r1: origin and size of the frame of the security
+    :param r2: origin and size of the frame telling that the network is hidden
+    :param rect_content_height: height of the content of the frames
+    :param translations: the translations of the texts
+    """
+    _ = translations.gettext
+    about_font_fam = FONTS['about']['fam']
+    about_font_size = FONTS['about']['size']
+    icon_font_fam = FONTS['icons']['fam']
+    rect_org_y = r1['org'].y
+    rect_width = r1['size'].x
+    rect_height = r1['size'].y
+
+    pdf.set_fill_color(255, 255, 255)
+    pdf.set_text_color(0, 0, 0)
+
+    path: fpdf.drawing.PaintedPath
+    with pdf.new_path() as path:
+        for rect in [r1, r2]:
+            path.add_path_element(
+                fpdf.drawing.RoundedRectangle(
+                    corner_radii=fpdf.drawing.Point(rect_height / 4, rect_height / 4),
+                    **rect
+                )
+            )
+
+    pdf.set_font(icon_font_fam, size=rect_content_height)
+    r1_icon_width = pdf.get_string_width(ICONS['security'])
+    pdf.text(
+        r1['org'].x + INTERLINE_SPACING,
+        rect_org_y + rect_content_height + INTERLINE_SPACING,  # Y coord to the bottom of the line
+        ICONS['security']
+    )
+    r2_icon_width = pdf.get_string_width(ICONS['hidden'])
+    pdf.text(
+        r2['org'].x + INTERLINE_SPACING,
+        rect_org_y + rect_content_height + INTERLINE_SPACING,
+        ICONS['hidden']
+    )
+
+    pdf.set_font(about_font_fam)
+    text_max_size(
+        pdf,
+        rect_width - INTERLINE_SPACING * 3 - r1_icon_width,
+        about_font_size,
+        r1['org'].x + INTERLINE_SPACING * 2 + r1_icon_width,
+        rect_org_y + INTERLINE_SPACING + about_font_size,
+        _('Security'),
+        style="B"
+    )
+    text_max_size(
+        pdf,
+        rect_width - INTERLINE_SPACING * 3 - r2_icon_width,
+        about_font_size,
+        r2['org'].x + INTERLINE_SPACING + r2_icon_width,
+        rect_org_y + INTERLINE_SPACING + about_font_size,
+        _('Hidden Wi-Fi'),
+        style="B"
+    )
+    text_max_size(
+        pdf,
+        rect_width - INTERLINE_SPACING * 3 - r2_icon_width,
+        about_font_size,
+        r2['org'].x + INTERLINE_SPACING + r2_icon_width,
+        rect_org_y + INTERLINE_SPACING + about_font_size * 2,
+        _('Not shown in the Wi-Fi list.'),
+        max_line=2,
+        interline=INTERLINE_SPACING,
+    )
+
+
+def text_max_size(pdf: fpdf.FPDF, width_text: int, max_font_size: int, x: float, y: float, text: str, max_line: int = 1,
+                  interline: Union[None, int] = None, style: str = "") -> None:
+    """
+    Write a text with the maximum font size which will never go beyond a defined size.
+    :param pdf: the FPDF object in which write
+    :param width_text: the maximum width of the desired text.
+    :param max_font_size: maximal font size to test
+    :param x: where write the text (x-axis)
+    :param y: where write the text (y-axis)
+    :param text: the text to write
+    :param max_line: If > 0, try to write the text on `max_line` lines.
+    :param interline: the size of interline spaces
+    :param style: the style to apply (`B`, `I`, `BI`, ``)
+    """
+    font_size, lines = fit_text(pdf, text, width_text, max_font_size, max_line, style)
+    pdf.set_font(size=font_size, style=style)
+    if len(lines) == 1:
+        pdf.text(x, y, text)
+        return
+
+    for line_id, line in enumerate(lines):
+        pdf.text(
+            x,
+            y + interline + line_id * font_size,
+            line
+        )
+
+
+def get_password_runs(password: str, char_table: CHAR_TABLE_TYPE) -> List[CHAR_SPEC_TYPE]:
+    """
+    Cut a password in runs of consecutive chars sharing the same font and color
+    :param password: the password
+    :param char_table: the specs of chars of the color set (see `layout.get_char_table`)
+    :return: the runs, as tuples of (font family, font style, font size, color, chars to display)
+    """
+    try:
+        specs = get_char_specs(password, char_table)
+    except UnsupportedCharError as e:
+        raise click.ClickException(f"Char '{e.char}' (U+{ord(e.char)}) is not supported (yet) in WiFi password (so "
+                                   f"in this program). ") from e
+
+    runs: List[list] = []
+    for spec in specs:
+        if runs and runs[-1][:4] == list(spec[:4]):
+            runs[-1][4] += spec[4]
+        else:
+            runs.append(list(spec))
+    return [tuple(run) for run in runs]
+
+
+def write_password(pdf: fpdf.FPDF, password: str, char_table: CHAR_TABLE_TYPE):
+    """
+    Write the password with the right color (of `char_table`) and font(s) in a PDF.
+    Font and color only change between runs of chars, but lines are wrapped exactly where writing the password char by
+    char would wrap them.
+    """
+    for font_family, font_style, font_size, font_color, text in get_password_runs(password, char_table):
+        pdf.set_font(font_family, font_style, font_size)
+        pdf.set_text_color(*font_color)
+        line_height = font_size + INTERLINE_SPACING
+
+        start = 0
+        width = 0
+        max_width = (pdf.w - pdf.x - pdf.r_margin - 2 * pdf.c_margin) * 1000 / pdf.font_size  # Like `pdf.write`
+        for i, char in enumerate(text):
+            char_width = pdf.get_normalized_string_width_with_style(char, pdf.font_style)
+            if width + char_width > max_width:
+                if i > start:
+                    pdf.write(line_height, text[start:i])
+                pdf.ln(line_height)
+                start = i
+                width = 0
+                max_width = (pdf.w - pdf.x - pdf.r_margin - 2 * pdf.c_margin) * 1000 / pdf.font_size
+            width += char_width
+        pdf.write(line_height, text[start:])
@@ -0,0 +1,76 @@
+"""
+Color sets, optimized for some kinds of color-blind people
+"""
+from typing import Dict, Tuple
+
+import aenum
+
+import myhack
+
+COLOR_TYPE = Tuple[int, int, int]  # RGB
+COLORDICT_TYPE = Dict[str, COLOR_TYPE]
+
+
+class Colors(aenum.NamedConstant):
+    """Select colors"""
+    EVERYONE = {
+        'upper': (0x0c, 0x52, 0x75),
+        'lower': (0x09, 0x7d, 0xb8),
+        'numbers': (0xb3, 0x30, 0x00),
+        'special': (0x09, 0xb8, 0x32),
+        'space': (0x09, 0xb8, 0x32),
+    }
+
+    DEUTERANOPIA = {
+        'upper': (0x55, 0x5e, 0x75),
+        'lower': (0x5f, 0x7d, 0xbb),
+        'numbers': (0x00, 0x51, 0xb0),
+        'special': (0xaa, 0x99, 0x40),
+        'space': (0xaa, 0x99, 0x40),
+    }
+    PROTANOPIA = DEUTERANOPIA
+
+    TRITANOPIA = {
+        'upper': (0x00, 0x70, 0x6e),
+        'lower': (0x00, 0xa9, 0xa5),
+        'numbers': (0xfd, 0x00, 0x13),
+        'special': (0xcd, 0x5e, 0x8e),
+        'space': (0xcd, 0x5e, 0x8e),
+    }
+
+    BLACK_WHITE = {
+        'upper': (0x00, 0x00, 0x00),
+        'lower': (0x25, 0x25, 0x25),
+        'numbers': (0x50, 0x50, 0x50),
+        'special': (0x75, 0x75, 0x75),
+        'space': (0x75, 0x75, 0x75),
+    }
+
+    @property
+    def name(self):
+        return self._name_
+
+    @property
+    def value(self):
+        return self._value_
+
+    @classmethod
+    def default(cls):
+        return cls.EVERYONE
+
+    @classmethod
+    def from_string(cls, label: str):
+        return cls._members_[label.upper()]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, type(self)):
+            return self.value == other
+        return self.value == other.value and self.name == other.name
+
+    @classmethod
+    @myhack.run_once
+    def list(cls):
+        return list(map(lambda x: x.name, cls))
+
+    def casefold(self) -> str:
+        return self.name.casefold()
@@ -1,13 +1,91 @@
 """
 Configuration files manager
 """
-from typing import TextIO, Any, Mapping
+import csv
+import json
+import os
+import types
+from typing import TYPE_CHECKING, TextIO, Any, Callable, Mapping, Iterator, List, Sequence, Tuple, Union
 
 import click
-import jschon
-import tomlkit
 
+from myhack import run_once
 from paths import CONFIG_SCHEMA_PATH
+from validator import VALIDATOR_TYPE, compile_schema_file, schema_digest
+
+if TYPE_CHECKING:
+    import jschon
+
+
+@run_once
+def get_schema() -> 'jschon.JSONSchema':
+    """Load the schema of the configuration with jschon (only once)"""
+    import jschon  # Heavy: only imported when needed
+    jschon.create_catalog('2020-12')
+    return jschon.JSONSchema.loadf(CONFIG_SCHEMA_PATH)
+
+
+@run_once
+def get_generated_validators() -> Union[None, types.ModuleType]:
+    """
+    Return the validator module generated from the schema of the configuration (see `make.py validator`), or None if
+    it is out of date: the schema is then compiled instead (only once)
+    """
+    import config_validator
+    with open(CONFIG_SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        if config_validator.SCHEMA_SHA256 != schema_digest(f.read()):
+            return None
+    return config_validator
+
+
+@run_once
+def get_validator() -> VALIDATOR_TYPE:
+    """Return the validator of the configuration (only once)"""
+    generated = get_generated_validators()
+    if generated is not None:
+        return generated.validate
+    return compile_schema_file(CONFIG_SCHEMA_PATH)
+
+
+@run_once
+def get_wifi_validator() -> VALIDATOR_TYPE:
+    """Return the validator of a single network of the configuration (only once)"""
+    generated = get_generated_validators()
+    if generated is not None:
+        return generated.validate_defs_wifi
+    return compile_schema_file(CONFIG_SCHEMA_PATH, '#/$defs/wifi')
+
+
+def get_errors(config_dict: Mapping[str, Any]) -> List[str]:
+    """
+    Explain why a configuration is not valid
+    :param config_dict: the configuration
+    :return: the errors, readable by a human ; none if the configuration is valid
+    """
+    import jschon
+
+    # The compiled validator is fast, but only jschon can tell what is wrong
+    config_validity = get_schema().evaluate(jschon.JSON(config_dict))
+    if config_validity.valid:
+        return []
+
+    details: Mapping[str, Any] = config_validity.output('basic')
+    return [
+        f'In instance `{error["instanceLocation"]}`, in schema `{error["keywordLocation"]}` : {error["error"]}'
+        for error in details['errors']
+    ]
+
+
+def report_errors(config_dict: Mapping[str, Any]) -> bool:
+    """
+    Print why a configuration is not valid
+    :param config_dict: the configuration
+    :return: whether the configuration is valid, after all
+    """
+    errors = get_errors(config_dict)
+    for error in errors:
+        click.echo(click.style(error, bg='red', fg='white'))
+    return not errors
 
 
 def get_config_from_file(config_IO: TextIO) -> dict:
@@ -16,24 +94,79 @@ def get_config_from_file(config_IO: TextIO) -> dict:
     :param config_IO: configuration reader
     :return the configuration in a dict
     """
-    jschon.create_catalog('2020-12')
-    schema = jschon.JSONSchema.loadf(CONFIG_SCHEMA_PATH)
+    import tomlkit  # Heavy: only imported when needed
     config_dict = tomlkit.load(config_IO)
-    config_validity = schema.evaluate(jschon.JSON(config_dict))
-    if not config_validity.valid:
-        details: Mapping[str, Any] = config_validity.output('basic')
-        error: Mapping[str, str]
-        for error in details['errors']:
-            click.echo(click.style(
-                f'In instance `{error["instanceLocation"]}`, in schema `{error["keywordLocation"]}` : {error["error"]}',
-                bg='red',
-                fg='white'
-            ))
-
+    if not get_validator()(config_dict) and not report_errors(config_dict):
         raise click.ClickException('Configuration is not valid')
     return config_dict
 
 
+CONFIG_FORMATS: Tuple[str, ...] = ('toml', 'jsonl', 'csv')
+CONFIG_EXTENSIONS: Mapping[str, str] = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv',
+}
+CSV_TRUE = ('true', 'yes', 'y', '1')
+CSV_FALSE = ('false', 'no', 'n', '0', '')
+
+
+def guess_config_format(config_IO: TextIO) -> str:
+    """Guess the format of a configuration from the extension of its file name, TOML by default"""
+    extension = os.path.splitext(getattr(config_IO, 'name', ''))[1].lower()
+    return CONFIG_EXTENSIONS.get(extension, 'toml')
+
+
+def read_jsonl(config_IO: TextIO) -> Iterator[Tuple[int, Any]]:
+    """Read one network per line, as a JSON object (empty lines are skipped)"""
+    for line_number, line in enumerate(config_IO, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            raise click.ClickException(f'Line {line_number} is not valid JSON: {e}') from e
+
+
+def read_csv(config_IO: TextIO) -> Iterator[Tuple[int, Any]]:
+    """
+    Read one network per row ; the first row names the columns (`ssid`, `security`, `password`, `hidden`,
+    `language`).
+    Empty cells are considered as missing.
+    """
+    reader = csv.DictReader(config_IO)
+    for row in reader:
+        wifi = {key: value for key, value in row.items() if key is not None and value not in (None, '')}
+        hidden = wifi.get('hidden')
+        if hidden is not None and hidden.casefold() in CSV_TRUE + CSV_FALSE:
+            wifi['hidden'] = hidden.casefold() in CSV_TRUE
+        yield reader.line_num, wifi
+
+
+def iter_config_from_file(config_IO: TextIO, config_format: Union[None, str] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Parse the configuration, one network at a time when the format allows it (JSON Lines, CSV), so the memory does
+    not depend on the number of networks.
+    In these formats, each network is an object of the configuration schema, with a mandatory `ssid`.
+    :param config_IO: configuration reader
+    :param config_format: one of `CONFIG_FORMATS` ; guessed from the file name if not given
+    :return: pairs of (name, characteristics) of the networks, validated
+    """
+    config_format = config_format or guess_config_format(config_IO)
+    if config_format == 'toml':
+        yield from get_config_from_file(config_IO).items()
+        return
+
+    reader = read_csv if config_format == 'csv' else read_jsonl
+    validator = get_wifi_validator()
+    for line_number, wifi in reader(config_IO):
+        if not isinstance(wifi, Mapping) or not isinstance(wifi.get('ssid'), str):
+            raise click.ClickException(f'Network on line {line_number} is not valid: it needs an `ssid`')
+        if not validator(wifi) and not report_errors({wifi['ssid']: wifi}):
+            raise click.ClickException(f'Network on line {line_number} is not valid')
+        yield wifi['ssid'], wifi
+
+
 class MyString(click.types.StringParamType):
     """Like click.types.STRING, but with a way to check length"""
     NO_MAX_VALUE: int = -1
@@ -58,3 +191,22 @@ class MyString(click.types.StringParamType):
             raise click.ClickException('Value too large')
 
         return value
+
+
+class LazyChoice(click.Choice):
+    """Like click.Choice, but the choices are only listed when they are needed (they may be costly to list)"""
+
+    def __init__(self, get_choices: Callable[[], Sequence[str]], case_sensitive: bool = True):
+        super().__init__((), case_sensitive)
+        self.get_choices = get_choices
+        self._choices: Union[None, Sequence[str]] = None
+
+    @property
+    def choices(self) -> Sequence[str]:
+        if self._choices is None:
+            self._choices = self.get_choices()
+        return self._choices
+
+    @choices.setter
+    def choices(self, _: Sequence[str]) -> None:
+        pass  # Set by click.Choice.__init__
@@ -0,0 +1,24 @@
+"""
+Validator of `config.schema`, generated by `make.py validator`: do not edit.
+
+It only says if a document is valid: when it is not, ask jschon why.
+"""
+from typing import Any, Mapping
+
+SCHEMA_SHA256 = '01852bec83fe96a79b2a2567578404852e8cae25889180b544db79dbdc12b015'
+_NAMES_0 = frozenset(['hidden', 'language', 'password', 'security', 'ssid'])
+
+
+def validate(instance: Any) -> bool:
+    """Whether an instance is valid against `#`"""
+    return (isinstance(instance, Mapping) and all(validate_defs_wifi(value1) for name1, value1 in instance.items()))
+
+
+def validate_defs_wifi(instance: Any) -> bool:
+    """Whether an instance is valid against `#/$defs/wifi`"""
+    return (isinstance(instance, Mapping) and (('ssid' not in instance or (isinstance(instance['ssid'], str) and len(instance['ssid']) >= 1)) and ('security' not in instance or validate_defs_securitytypes(instance['security'])) and ('password' not in instance or (isinstance(instance['password'], str) and len(instance['password']) >= 8 and len(instance['password']) <= 63)) and ('hidden' not in instance or isinstance(instance['hidden'], bool)) and ('language' not in instance or (isinstance(instance['language'], str) and len(instance['language']) >= 1))) and ('security' in instance) and _NAMES_0.issuperset(instance) and (sum(((('security' not in instance or instance['security'] == 'Open')), (('security' not in instance or instance['security'] == 'Enhanced Open')), ('password' in instance),)) == 1))
+
+
+def validate_defs_securitytypes(instance: Any) -> bool:
+    """Whether an instance is valid against `#/$defs/securitytypes`"""
+    return (sum((instance == 'Open', instance == 'Enhanced Open', instance == 'WEP', instance == 'WPA', instance == 'WPA2-PSK', instance == 'WPA3-PSK',)) == 1)
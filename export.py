@@ -0,0 +1,136 @@
+"""
+Export of the cards as images (PNG or SVG), one per network, rendered in a pool of processes
+
+Only the images of the networks which changed are rendered again: the key of each image (see `pagecache.get_card_key`)
+is kept in a manifest next to them.
+"""
+import concurrent.futures
+import itertools
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Mapping, Set, Tuple, Union
+
+import click
+
+NETWORK_TYPE = Tuple[str, Mapping]
+IMAGE_FORMATS: Tuple[str, ...] = ('png', 'svg')
+MANIFEST_NAME = 'manifest.json'
+UNSAFE_FILE_NAME = re.compile(r'[^\w.-]+')
+
+
+def get_file_name(name: str, image_format: str, used: Set[str]) -> str:
+    """
+    Return the name of the image of a network, unique even on case-insensitive file systems
+    :param name: the name of the network in the configuration
+    :param image_format: one of `IMAGE_FORMATS`
+    :param used: the names already given, in lower case ; updated
+    :return: the file name
+    """
+    root = UNSAFE_FILE_NAME.sub('_', name).strip('._') or 'network'
+    file_name = f'{root}.{image_format}'
+    for index in itertools.count(2):
+        if file_name.lower() not in used:
+            break
+        file_name = f'{root}-{index}.{image_format}'
+    used.add(file_name.lower())
+    return file_name
+
+
+def render_image(pdf: bytes, image_format: str, dpi: int) -> bytes:
+    """Render the first page of a PDF as an image ; the DPI only matters to PNG"""
+    import pymupdf
+    with pymupdf.open(stream=pdf, filetype='pdf') as document:
+        page = document[0]
+        if image_format == 'svg':
+            return page.get_svg_image(text_as_path=True).encode('utf-8')
+        return page.get_pixmap(dpi=dpi).tobytes('png')
+
+
+def export_card(name: str, wifi: Mapping, path: str, image_format: str, dpi: int) -> None:
+    """Render the card of a network as an image, and write it atomically (run by the workers)"""
+    from card import build_pdf
+    image = render_image(bytes(build_pdf([(name, wifi)]).output()), image_format, dpi)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(image)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: str) -> Dict[str, str]:
+    """Return the keys of the images of a previous export, by file name ; empty if there is none"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return {card['file']: card['key'] for card in json.load(f)['cards']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def export(networks: Iterable[NETWORK_TYPE], directory: str, image_format: str, dpi: int, jobs: int,
+           settings: Union[None, dict] = None) -> None:
+    """
+    Write the card of each network as an image, rendering only the ones which are missing or out of date
+    :param networks: the networks to export, in order
+    :param directory: where to write the images and their manifest
+    :param image_format: one of `IMAGE_FORMATS`
+    :param dpi: resolution of PNG images
+    :param jobs: number of worker processes
+    :param settings: the settings of the `main` group, to set up the rendering
+    """
+    try:
+        import pymupdf
+    except ImportError as e:
+        raise click.ClickException('Exporting images requires `pymupdf` (install the `export` extra).') from e
+    import pagecache  # Heavy (imports the rendering): only imported when needed, `--help` lists `IMAGE_FORMATS`
+    from card import setup
+
+    settings = dict(settings or {}, per_page=1)
+    document_inputs = pagecache.get_document_inputs(settings) + [
+        image_format,
+        dpi if image_format == 'png' else None,
+        pymupdf.VersionBind,
+    ]
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    previous = read_manifest(manifest_path)
+
+    cards: List[Dict[str, str]] = []
+    outdated: List[Tuple[str, Mapping, str]] = []
+    used: Set[str] = set()
+    for name, wifi in networks:
+        file_name = get_file_name(name, image_format, used)
+        key = pagecache.get_card_key(document_inputs, name, wifi)
+        cards.append({'file': file_name, 'network': name, 'key': key})
+        path = os.path.join(directory, file_name)
+        if previous.get(file_name) != key or not os.path.isfile(path):
+            outdated.append((name, wifi, path))
+
+    if jobs > 1 and len(outdated) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(jobs, len(outdated)),
+                initializer=setup,
+                initargs=(settings,)
+        ) as executor:
+            names, wifis, paths = zip(*outdated)
+            list(executor.map(export_card, names, wifis, paths, itertools.repeat(image_format), itertools.repeat(dpi),
+                              chunksize=max(1, len(outdated) // (jobs * 4))))
+    elif outdated:
+        setup(settings)
+        for name, wifi, path in outdated:
+            export_card(name, wifi, path, image_format, dpi)
+
+    # Images of networks which are no longer in the configuration
+    for file_name in previous.keys() - {card['file'] for card in cards}:
+        if os.path.basename(file_name) == file_name:
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError:
+                pass
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': image_format,
+            'dpi': dpi,
+            'cards': cards,
+        }, f, indent=2, ensure_ascii=False)
+    click.echo(f'{len(outdated)} image(s) rendered, {len(cards) - len(outdated)} up to date.', err=True)
@@ -0,0 +1,87 @@
+"""
+Cache of the parsed fonts, in memory and on disk
+"""
+import array
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Tuple
+
+from fpdf.ttfonts import TTFontFile
+
+from paths import cache_path
+
+CACHE_FORMAT = 1
+WIDTHS_TYPECODE = 'd'  # Widths are stored as an array, way faster to load than JSON
+METRICS_TYPE = Dict[str, Any]
+_METRICS: Dict[Tuple[str, int, int], METRICS_TYPE] = {}
+
+
+def parse_font(ttf_path: str) -> METRICS_TYPE:
+    """Parse a TTF file and return what FPDF needs to register it (see `fpdf.FPDF.add_font`)."""
+    ttf = TTFontFile()
+    ttf.getMetrics(ttf_path)
+    return {
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'desc': {
+            'Ascent': round(ttf.ascent),
+            'Descent': round(ttf.descent),
+            'CapHeight': round(ttf.capHeight),
+            'Flags': ttf.flags,
+            'FontBBox': f'[{ttf.bbox[0]:.0f} {ttf.bbox[1]:.0f} {ttf.bbox[2]:.0f} {ttf.bbox[3]:.0f}]',
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': round(ttf.stemV),
+            'MissingWidth': round(ttf.defaultWidth),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'cw': array.array(WIDTHS_TYPECODE, ttf.charWidths),
+        'originalsize': os.stat(ttf_path).st_size,
+    }
+
+
+def get_font_metrics(ttf_path: str) -> METRICS_TYPE:
+    """
+    Return the parsed data of a TTF file, from the cache if the file did not change since it has been cached.
+    :param ttf_path: path of the TTF file
+    :return: what `parse_font` returns
+    """
+    ttf_path = os.path.realpath(ttf_path)
+    stat = os.stat(ttf_path)
+    key = (ttf_path, stat.st_mtime_ns, stat.st_size)
+    metrics = _METRICS.get(key)
+    if metrics is not None:
+        return metrics
+
+    disk_path = cache_path('fonts', hashlib.sha256(ttf_path.encode('utf-8')).hexdigest())
+    try:
+        with open(disk_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header['format'] == CACHE_FORMAT and header['mtime_ns'] == key[1] and header['size'] == key[2]:
+                metrics = header['metrics']
+                metrics['cw'] = array.array(WIDTHS_TYPECODE)
+                metrics['cw'].frombytes(f.read())
+    except (OSError, ValueError, KeyError):
+        metrics = None
+
+    if metrics is None:
+        metrics = parse_font(ttf_path)
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f'{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps({
+                    'format': CACHE_FORMAT,
+                    'mtime_ns': key[1],
+                    'size': key[2],
+                    'metrics': {k: v for k, v in metrics.items() if k != 'cw'},
+                }).encode('utf-8') + b'\n')
+                f.write(metrics['cw'].tobytes())
+            os.replace(tmp_path, disk_path)
+        except OSError:
+            pass  # A read-only cache only costs some time
+
+    _METRICS[key] = metrics
+    return metrics
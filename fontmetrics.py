@@ -0,0 +1,147 @@
+"""
+Tables of the metrics of the bundled fonts, generated by `make.py metrics`: text is measured, and fonts are registered
+in documents, without loading the TTF files (they are only read to be embedded)
+
+The advance widths of a font are an array of 16 bits integers, by code point, memory-mapped: loading it costs nothing,
+and the processes rendering at the same time share it. What FPDF needs to register a font is in the JSON index.
+When the tables are missing, or older than the fonts, the fonts are parsed instead (see `fontcache`).
+"""
+import array
+import json
+import mmap
+import os
+import sys
+import threading
+from typing import Dict, Mapping, Union
+
+import fontcache
+from paths import FONT_METRICS_DIR, font_path
+
+METRICS_FORMAT = 1
+INDEX_NAME = 'index.json'
+WIDTHS_TYPECODE = 'H'
+DEFAULT_WIDTH = 0  # In the tables, the width of the chars which are not in the font: no char has a null width
+ZERO_WIDTH = 65535  # The width of the chars which have a null width (see `fpdf.ttfonts.TTFontFile.getHMTX`)
+_TABLES: Dict[str, Union[None, fontcache.METRICS_TYPE]] = {}  # By path of TTF file ; None if there is no table
+_TABLES_LOCK = threading.Lock()
+
+
+class WidthTable:
+    """
+    Advance widths of the chars of a font, by code point, as FPDF reads them (see `fpdf.fpdf._char_width`): the chars
+    beyond the table have no width, FPDF uses the missing width of the font for them.
+    """
+
+    def __init__(self, widths: memoryview, length: int, default_width: float):
+        """
+        :param widths: the widths stored in the table ; the chars after them have the default width
+        :param length: number of chars which have a width
+        :param default_width: the width of the chars which are not in the font
+        """
+        self.widths = widths
+        self.length = length
+        self.default_width = default_width
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, char: int) -> float:
+        if not 0 <= char < self.length:
+            raise IndexError(char)
+        if char >= len(self.widths):
+            return self.default_width
+        width = self.widths[char]
+        return self.default_width if width == DEFAULT_WIDTH else float(width)  # Floats, as `fontcache` gives
+
+
+def get_string_width(metrics: fontcache.METRICS_TYPE, text: str) -> float:
+    """
+    Measure a text as `fpdf.FPDF.get_normalized_string_width_with_style` does, without any document
+    :param metrics: the metrics of the font (see `get_font_metrics`)
+    :param text: the text
+    :return: its width, in thousandths of the font size
+    """
+    widths = metrics['cw']
+    missing_width = metrics['desc']['MissingWidth'] or 500
+    width = 0
+    for char in text:
+        try:
+            char_width = widths[ord(char)]
+        except IndexError:
+            char_width = missing_width
+        if char_width != ZERO_WIDTH:
+            width += char_width
+    return width
+
+
+def build_tables(font_files: Mapping[str, str], directory: str = FONT_METRICS_DIR) -> None:
+    """
+    Parse fonts, and write their tables and the index
+    :param font_files: the TTF files, by FPDF font key
+    :param directory: where to write them
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = {
+        'format': METRICS_FORMAT,
+        'byteorder': sys.byteorder,
+        'fonts': {},
+    }
+    for fontkey, ttf_path in font_files.items():
+        metrics = fontcache.parse_font(ttf_path)
+        # Chars which are not in the font have the width of the glyph 0, which is not rounded (see
+        # `fpdf.ttfonts.TTFontFile.getHMTX`): it is the only width which may not be an integer
+        default_width = next((width for width in metrics['cw'][1:] if not width.is_integer()),
+                             float(metrics['desc']['MissingWidth']))
+        widths = [DEFAULT_WIDTH if width == default_width else int(width) for width in metrics['cw']]
+        if any(not 0 < width <= ZERO_WIDTH for width in widths[1:] if width != DEFAULT_WIDTH):
+            raise ValueError(f'Widths of {ttf_path} do not fit in 16 bits')
+        stored = len(widths)
+        while stored > 1 and widths[stored - 1] == DEFAULT_WIDTH:
+            stored -= 1
+        table_name = f'{fontkey}.widths'
+        with open(os.path.join(directory, table_name), 'wb') as f:
+            f.write(array.array(WIDTHS_TYPECODE, widths[:stored]).tobytes())
+
+        stat = os.stat(ttf_path)
+        index['fonts'][os.path.relpath(os.path.realpath(ttf_path), font_path())] = {
+            'table': table_name,
+            'length': len(widths),
+            'default_width': default_width,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'metrics': {k: v for k, v in metrics.items() if k != 'cw'},
+        }
+
+    with open(os.path.join(directory, INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+
+
+def load_table(ttf_path: str, directory: str = FONT_METRICS_DIR) -> Union[None, fontcache.METRICS_TYPE]:
+    """Return the metrics of a font from its table ; None if there is none, or if the font changed since"""
+    try:
+        with open(os.path.join(directory, INDEX_NAME), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index['format'] != METRICS_FORMAT or index['byteorder'] != sys.byteorder:
+            return None
+        font = index['fonts'][os.path.relpath(os.path.realpath(ttf_path), font_path())]
+        stat = os.stat(ttf_path)
+        if font['mtime_ns'] != stat.st_mtime_ns or font['size'] != stat.st_size:
+            return None
+        with open(os.path.join(directory, font['table']), 'rb') as f:
+            widths = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(WIDTHS_TYPECODE)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return dict(font['metrics'], cw=WidthTable(widths, font['length'], font['default_width']))
+
+
+def get_font_metrics(ttf_path: str) -> fontcache.METRICS_TYPE:
+    """
+    Return what FPDF needs to register a font (see `fontcache.parse_font`), from its table if it is up to date, else
+    by parsing it
+    :param ttf_path: path of the TTF file
+    """
+    with _TABLES_LOCK:
+        if ttf_path not in _TABLES:
+            _TABLES[ttf_path] = load_table(ttf_path)
+        metrics = _TABLES[ttf_path]
+    return fontcache.get_font_metrics(ttf_path) if metrics is None else metrics
@@ -3,7 +3,7 @@ All the i18n/l10n stuff
 """
 import gettext
 import os
-from typing import List
+from typing import Dict, List
 
 import locale
 from myhack import run_once
@@ -11,11 +11,7 @@ from paths import LOCALE_PATH
 
 DEFAULT_LANGUAGE = 'System'
 GETTEXT_DOMAIN = 'locale'
-
-
-def _(x: str) -> str:
-    import builtins
-    return builtins.__dict__.get('_', lambda x: x)(x)
+CATALOGS: Dict[str, gettext.NullTranslations] = {}  # By resolved language (see `get_catalog`)
 
 
 @run_once
@@ -31,22 +27,30 @@ def get_translations() -> List[str]:
     return ret
 
 
-@run_once
-def install_translation(lang: str) -> None:
-    """
-    Create the `_` function.
-    :param lang:
-    """
+def resolve_language(lang: str) -> str:
+    """Return the language really used when `lang` is asked (the one of the system, by default)"""
     if lang == DEFAULT_LANGUAGE:
         lang = locale.getlocale()[0]
 
     if lang is None or lang == 'C':
         lang = 'en'
+    return lang
+
 
-    locale.setlocale(locale.LC_ALL, lang)
-    t = gettext.translation(
-        GETTEXT_DOMAIN,
-        LOCALE_PATH,
-        languages=[lang]
-    )
-    t.install()
+def get_catalog(lang: str) -> gettext.NullTranslations:
+    """
+    Return the translations of a language, loaded only once. Nothing global is changed: the catalog has to be given
+    to what renders in this language.
+    :param lang: the language (see `resolve_language`)
+    :return: the catalog ; use its `gettext` method as `_`
+    :raise LookupError: if there is no translation for this language
+    """
+    lang = resolve_language(lang)
+    catalog = CATALOGS.get(lang)
+    if catalog is None:
+        try:
+            catalog = gettext.translation(GETTEXT_DOMAIN, LOCALE_PATH, languages=[lang])
+        except OSError as e:
+            raise LookupError(f'No translation for `{lang}`') from e
+        CATALOGS[lang] = catalog
+    return catalog
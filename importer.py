@@ -0,0 +1,446 @@
+"""
+Import of networks from the configurations of access points and clients: hostapd (`hostapd.conf`), wpa_supplicant
+(`wpa_supplicant.conf`) and NetworkManager (`.nmconnection` keyfiles)
+
+Files are parsed line by line, by a pool of processes, and their networks come out in the order of the files.
+Networks are named by their SSID: a network found in several files (e.g. the access point and a client) is imported
+once. Networks which cannot be printed (enterprise networks, or only the hash of the passphrase stored...) are
+skipped, with the reason.
+"""
+import concurrent.futures
+import configparser
+import contextlib
+import itertools
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Set, Tuple, Union
+
+import click
+
+from config import get_validator, get_wifi_validator
+from myhack import open_atomic
+from wifi import WifiSecurity
+
+NETWORK_TYPE = Tuple[str, Dict[str, Any]]  # name, characteristics (as in a configuration)
+SETTINGS_TYPE = Mapping[str, Any]  # The settings of a network, as written in its file
+RAW_PSK_RE = re.compile(r'[0-9a-fA-F]{64}')
+HEX_KEY_RE = re.compile(r'[0-9a-fA-F]+')
+BYTE_LIST_RE = re.compile(r'(?:[0-9]+;)+[0-9]*')  # SSID of the older NetworkManager keyfiles
+PRINTF_RE = re.compile(rb'\\(x[0-9a-fA-F]{1,2}|[0-7]{1,3}|.)', re.S)
+PRINTF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'e': b'\x1b'}
+KEYFILE_ESCAPE_RE = re.compile(r'\\(.)', re.S)
+KEYFILE_ESCAPES = {'s': ' ', 'n': '\n', 't': '\t', 'r': '\r'}
+SAE_PARAMETER_RE = re.compile(r'\|(?:mac|vlanid|id|pk)=')  # See `sae_password` in hostapd.conf
+PSK_KEY_MGMT = ('WPA-PSK', 'WPA-PSK-SHA256', 'FT-PSK')
+SAE_KEY_MGMT = ('SAE', 'FT-SAE', 'SAE-EXT-KEY', 'FT-SAE-EXT-KEY')
+SNIFFED_LINES = 200  # Lines read to guess the format of a `.conf` file, when its name does not tell it
+HOSTAPD_KEYS = ('interface', 'bss', 'ssid', 'ssid2', 'hw_mode', 'channel', 'wpa_passphrase')
+TOML_BARE_KEY_RE = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def decode_text(raw: bytes, what: str) -> str:
+    """Decode an SSID or a password ; raise ValueError if it is not UTF-8 text"""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError(f'its {what} is not UTF-8 text') from None
+
+
+def check_text(text: Union[None, str], what: str) -> None:
+    """Raise ValueError if a text read from a file (with `surrogateescape`) is not UTF-8 text"""
+    if text is not None:
+        try:
+            text.encode('utf-8')
+        except UnicodeEncodeError:
+            raise ValueError(f'its {what} is not UTF-8 text') from None
+
+
+def decode_printf(value: str) -> bytes:
+    """Decode a string escaped as C strings (`P"..."` strings of hostapd and wpa_supplicant)"""
+    def unescape(match: 're.Match[bytes]') -> bytes:
+        escape = match.group(1)
+        if escape[:1] == b'x':
+            return bytes([int(escape[1:], 16)])
+        if escape[:1] in b'01234567':
+            return bytes([int(escape, 8) & 0xff])
+        return PRINTF_ESCAPES.get(escape, escape)
+
+    return PRINTF_RE.sub(unescape, value.encode('utf-8', 'surrogateescape'))
+
+
+def parse_string(value: str) -> bytes:
+    """
+    Parse a string of hostapd or wpa_supplicant: `"quoted"`, `P"escaped"` or hexadecimal
+    :raise ValueError: if it is none of them
+    """
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].encode('utf-8', 'surrogateescape')
+    if len(value) >= 3 and value[:2] == 'P"' and value[-1] == '"':
+        return decode_printf(value[2:-1])
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        raise ValueError(f'`{value}` is not a string') from None
+
+
+def parse_wep_key(value: str) -> str:
+    """Parse a WEP key of hostapd or wpa_supplicant: hexadecimal keys are kept as they are, as in QR codes"""
+    return value if HEX_KEY_RE.fullmatch(value) else decode_text(parse_string(value), 'password')
+
+
+def get_security(key_mgmt: Sequence[str], wpa_only: bool = False) -> WifiSecurity:
+    """
+    Return the security of a network from its key managements (as named by hostapd and wpa_supplicant)
+    :param key_mgmt: the key managements accepted by the network
+    :param wpa_only: if the network only accepts WPA (not WPA2)
+    :raise ValueError: if the network cannot be printed
+    """
+    if any(suite in key_mgmt for suite in PSK_KEY_MGMT):  # Including WPA3 transition: WPA2 devices can join too
+        return WifiSecurity.WPA if wpa_only else WifiSecurity.WPA2PSK
+    if any(suite in key_mgmt for suite in SAE_KEY_MGMT):
+        return WifiSecurity.WPA3PSK
+    if 'OWE' in key_mgmt:
+        return WifiSecurity.ENHANCED_OPEN
+    if 'NONE' in key_mgmt:
+        return WifiSecurity.OPEN
+    raise ValueError(f'`{" ".join(key_mgmt)}` networks (enterprise...) cannot be printed')
+
+
+def make_network(ssid: Union[None, str], security: WifiSecurity, password: Union[None, str] = None,
+                 hidden: bool = False) -> NETWORK_TYPE:
+    """
+    Return a network as in a configuration, named by its SSID
+    :raise ValueError: if it cannot be printed
+    """
+    check_text(ssid, 'SSID')
+    check_text(password, 'password')
+    if not ssid:
+        raise ValueError('it has no SSID')
+    wifi: Dict[str, Any] = {'security': security.label}
+    if not security.is_open:
+        if password is None:
+            raise ValueError('it has no password')
+        if not 8 <= len(password) <= 63:
+            raise ValueError(f'its password has {len(password)} chars: only passwords of 8 to 63 chars can be '
+                             f'printed')
+        wifi['password'] = password
+    if hidden:
+        wifi['hidden'] = True
+    if not get_wifi_validator()(wifi):
+        raise ValueError('it is not valid (see `config.schema`)')
+    return ssid, wifi
+
+
+def read_hostapd(lines: Iterable[str]) -> Iterator[Tuple[int, SETTINGS_TYPE]]:
+    """Read the settings of each BSS of a `hostapd.conf` file, with the line where it starts"""
+    bss: Dict[str, str] = {}
+    start = 1
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')  # Values are not stripped: a passphrase can end with a space
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        if key == 'bss':  # Starts the next BSS
+            yield start, bss
+            bss, start = {}, line_number
+        else:
+            bss[key] = value
+    yield start, bss
+
+
+def get_hostapd_network(bss: SETTINGS_TYPE) -> NETWORK_TYPE:
+    """Return the network of a BSS of hostapd ; raise ValueError if it cannot be printed"""
+    if 'ssid2' in bss:
+        ssid = decode_text(parse_string(bss['ssid2']), 'SSID')
+    else:
+        ssid = bss.get('ssid')
+    hidden = bss.get('ignore_broadcast_ssid', '0') != '0'
+    try:
+        wpa = int(bss.get('wpa', '0'))
+    except ValueError:
+        raise ValueError(f'`wpa={bss["wpa"]}` is not a number') from None
+
+    if not wpa:
+        if bss.get('ieee8021x', '0') != '0':
+            raise ValueError('IEEE 802.1X networks cannot be printed')
+        key = bss.get(f'wep_key{bss.get("wep_default_key", "0")}')
+        if key is None:
+            return make_network(ssid, WifiSecurity.OPEN, hidden=hidden)
+        return make_network(ssid, WifiSecurity.WEP, parse_wep_key(key), hidden)
+
+    security = get_security(bss.get('wpa_key_mgmt', 'WPA-PSK').split(), wpa_only=wpa == 1)
+    password = bss.get('wpa_passphrase')
+    if security == WifiSecurity.WPA3PSK and 'sae_password' in bss:
+        password = SAE_PARAMETER_RE.split(bss['sae_password'], 1)[0]
+    if password is None and not security.is_open and ('wpa_psk' in bss or 'wpa_psk_file' in bss):
+        raise ValueError('only the hash of its passphrase is stored (`wpa_psk`)')
+    return make_network(ssid, security, password, hidden)
+
+
+def strip_comment(line: str) -> str:
+    """Remove the comment of a line of wpa_supplicant (unless it is in a quoted string), and the spaces around"""
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == '#' and not quoted:
+            return line[:i].strip()
+    return line.strip()
+
+
+def read_wpa_supplicant(lines: Iterable[str]) -> Iterator[Tuple[int, SETTINGS_TYPE]]:
+    """Read the settings of each `network` block of a `wpa_supplicant.conf` file, with the line where it starts"""
+    network: Union[None, Dict[str, str]] = None
+    start = 0
+    for line_number, line in enumerate(lines, start=1):
+        line = strip_comment(line)
+        if network is None:
+            if line.replace(' ', '') == 'network={':
+                network, start = {}, line_number
+        elif line == '}':
+            yield start, network
+            network = None
+        elif '=' in line:
+            key, value = line.split('=', 1)
+            network[key.strip()] = value.strip()
+    if network is not None:
+        raise ValueError(f'the network of line {start} is not closed')
+
+
+def get_wpa_supplicant_password(network: SETTINGS_TYPE, key: str) -> Union[None, str]:
+    """Return a password of a network of wpa_supplicant, if it is stored"""
+    value = network.get(key)
+    if value is None:
+        return None
+    if key == 'psk' and RAW_PSK_RE.fullmatch(value):
+        raise ValueError('only the hash of its passphrase is stored (`psk`)')
+    return decode_text(parse_string(value), 'password')
+
+
+def get_wpa_supplicant_network(network: SETTINGS_TYPE) -> NETWORK_TYPE:
+    """Return a network of wpa_supplicant ; raise ValueError if it cannot be printed"""
+    ssid = decode_text(parse_string(network['ssid']), 'SSID') if 'ssid' in network else None
+    hidden = network.get('scan_ssid', '0') != '0'
+    proto = network.get('proto', 'WPA RSN').split()
+    security = get_security(network.get('key_mgmt', 'WPA-PSK WPA-EAP').split(), wpa_only=proto == ['WPA'])
+
+    if security == WifiSecurity.OPEN:
+        key = network.get(f'wep_key{network.get("wep_tx_keyidx", "0")}')
+        if key is None:
+            return make_network(ssid, WifiSecurity.OPEN, hidden=hidden)
+        return make_network(ssid, WifiSecurity.WEP, parse_wep_key(key), hidden)
+    if security == WifiSecurity.WPA3PSK and 'sae_password' in network:
+        return make_network(ssid, security, get_wpa_supplicant_password(network, 'sae_password'), hidden)
+    return make_network(ssid, security, get_wpa_supplicant_password(network, 'psk'), hidden)
+
+
+def unescape_keyfile(value: str) -> str:
+    """Unescape a value of a keyfile (`\\s`, `\\n`...)"""
+    return KEYFILE_ESCAPE_RE.sub(lambda match: KEYFILE_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def read_networkmanager(lines: Iterable[str]) -> Iterator[Tuple[int, SETTINGS_TYPE]]:
+    """Read the groups of settings of a NetworkManager keyfile (one connection per file)"""
+    parser = configparser.ConfigParser(delimiters=('=',), comment_prefixes=('#',), inline_comment_prefixes=None,
+                                       strict=False, interpolation=None, default_section='')
+    parser.optionxform = str  # Keys are case-sensitive
+    try:
+        parser.read_file(lines)
+    except configparser.Error as e:
+        raise ValueError(f'it is not a keyfile: {e}') from e
+    yield 1, {
+        group: {key: unescape_keyfile(value) for key, value in parser.items(group)}
+        for group in parser.sections()
+    }
+
+
+def get_networkmanager_network(keyfile: SETTINGS_TYPE) -> Union[None, NETWORK_TYPE]:
+    """
+    Return the network of a NetworkManager connection ; None if it is not a Wi-Fi connection
+    :raise ValueError: if it cannot be printed
+    """
+    if keyfile.get('connection', {}).get('type') not in ('wifi', '802-11-wireless'):
+        return None
+    wifi = keyfile.get('wifi') or keyfile.get('802-11-wireless') or {}
+    ssid = wifi.get('ssid')
+    if ssid is not None and BYTE_LIST_RE.fullmatch(ssid):
+        ssid = decode_text(bytes(int(byte) & 0xff for byte in ssid.split(';') if byte), 'SSID')
+    hidden = wifi.get('hidden', 'false').lower() in ('true', '1')
+
+    security_group = keyfile.get('wifi-security') or keyfile.get('802-11-wireless-security')
+    if security_group is None:
+        return make_network(ssid, WifiSecurity.OPEN, hidden=hidden)
+    proto = [proto for proto in security_group.get('proto', '').split(';') if proto]
+    security = get_security([security_group.get('key-mgmt', 'none').upper()], wpa_only=proto == ['wpa'])
+
+    if security == WifiSecurity.OPEN:  # Static WEP
+        if security_group.get('wep-key-type') == '2':
+            raise ValueError('only the passphrase its WEP key is derived from is stored (`wep-key-type=2`)')
+        key = security_group.get(f'wep-key{security_group.get("wep-tx-keyidx", "0")}')
+        if key is None:
+            raise ValueError('its WEP key is not stored in the file')
+        return make_network(ssid, WifiSecurity.WEP, key, hidden)
+    password = security_group.get('psk')
+    if password is None and not security.is_open and security_group.get('psk-flags', '0') != '0':
+        raise ValueError('its password is kept by a secret agent, not in the file (`psk-flags`)')
+    if password is not None and RAW_PSK_RE.fullmatch(password):
+        raise ValueError('only the hash of its passphrase is stored (`psk`)')
+    return make_network(ssid, security, password, hidden)
+
+
+SOURCE_FORMATS: Mapping[str, Tuple[Callable[[Iterable[str]], Iterator[Tuple[int, SETTINGS_TYPE]]],
+                                   Callable[[SETTINGS_TYPE], Union[None, NETWORK_TYPE]]]] = {
+    'hostapd': (read_hostapd, get_hostapd_network),
+    'wpa_supplicant': (read_wpa_supplicant, get_wpa_supplicant_network),
+    'networkmanager': (read_networkmanager, get_networkmanager_network),
+}
+
+
+def guess_source_format(path: str) -> Union[None, str]:
+    """
+    Guess the format of a file from its name, or from its first settings for the other `.conf` files
+    :return: one of `SOURCE_FORMATS` ; None if it is none of them
+    """
+    name = os.path.basename(path).lower()
+    if name.endswith('.nmconnection'):
+        return 'networkmanager'
+    if not name.endswith('.conf'):
+        return None
+    if name.startswith('hostapd'):
+        return 'hostapd'
+    if name.startswith('wpa_supplicant'):
+        return 'wpa_supplicant'
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in itertools.islice(f, SNIFFED_LINES):
+                line = line.strip()
+                if line.replace(' ', '').startswith('network={'):
+                    return 'wpa_supplicant'
+                if line.split('=', 1)[0] in HOSTAPD_KEYS:
+                    return 'hostapd'
+    except OSError:
+        pass
+    return None
+
+
+def find_files(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    List the files to import, in order: the given ones, and the ones found in the given directories (and their
+    subdirectories), sorted by path
+    :return: pairs of (path, format) of the files
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            source_format = guess_source_format(path)
+            if source_format is None:
+                raise click.ClickException(f'{path} is not a hostapd, wpa_supplicant or NetworkManager file.')
+            yield path, source_format
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                file_path = os.path.join(directory, name)
+                source_format = guess_source_format(file_path)
+                if source_format is not None:
+                    yield file_path, source_format
+
+
+def import_file(path: str, source_format: str) -> List[Tuple[int, Union[str, NETWORK_TYPE]]]:
+    """
+    Read the networks of a file (run by the workers)
+    :param path: the file
+    :param source_format: one of `SOURCE_FORMATS`
+    :return: the line where each network starts (0: the whole file), and the network, or why it is skipped
+    """
+    reader, get_network = SOURCE_FORMATS[source_format]
+    ret: List[Tuple[int, Union[str, NETWORK_TYPE]]] = []
+    try:
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            for line_number, settings in reader(f):
+                try:
+                    network = get_network(settings)
+                except ValueError as e:
+                    ret.append((line_number, str(e)))
+                    continue
+                if network is not None:
+                    ret.append((line_number, network))
+    except (OSError, ValueError) as e:
+        ret.append((0, f'cannot be read: {e}'))
+    return ret
+
+
+def import_networks(paths: Sequence[str], jobs: int) -> Iterator[NETWORK_TYPE]:
+    """
+    Import the networks of files, parsed by a pool of processes
+    A network found again is skipped ; another network with the same SSID is named after it (`SSID (2)`).
+    :param paths: the files, and the directories of files, to import
+    :param jobs: number of worker processes
+    :return: the networks, in the order of the files
+    :raise click.ClickException: if no network can be printed
+    """
+    files = list(find_files(paths))
+    imported = duplicates = skipped = 0
+    by_ssid: Dict[str, List[Dict[str, Any]]] = {}
+    names: Set[str] = set()
+    file_paths, formats = zip(*files) if files else ((), ())
+    parallel = jobs > 1 and len(files) > 1
+    with (concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(files))) if parallel
+          else contextlib.nullcontext()) as executor:
+        if executor is None:
+            results = map(import_file, file_paths, formats)
+        else:
+            results = executor.map(import_file, file_paths, formats, chunksize=max(1, len(files) // (jobs * 4)))
+        for path, networks in zip(file_paths, results):
+            for line_number, network in networks:
+                if isinstance(network, str):
+                    skipped += 1
+                    click.echo(f'{path}{f":{line_number}" if line_number else ""}: skipped: {network}.', err=True)
+                    continue
+                ssid, wifi = network
+                same_ssid = by_ssid.setdefault(ssid, [])
+                if wifi in same_ssid:
+                    duplicates += 1
+                    continue
+                same_ssid.append(wifi)
+                imported += 1
+                name, suffix = ssid, 1
+                while name in names:
+                    suffix += 1
+                    name = f'{ssid} ({suffix})'
+                names.add(name)
+                yield name, wifi if name == ssid else dict(wifi, ssid=ssid)
+
+    click.echo(f'{imported} network(s) imported from {len(files)} file(s), {duplicates} duplicate(s), {skipped} '
+               f'skipped.', err=True)
+    if not imported:
+        raise click.ClickException('No network to print was found.')
+
+
+def guess_output_format(output: str) -> str:
+    """Guess what to write from the extension of the output: a configuration (`.toml`), else a PDF"""
+    return 'toml' if os.path.splitext(output)[1].lower() == '.toml' else 'pdf'
+
+
+def dump_toml_string(text: str) -> str:
+    """Write a string as a TOML basic string: JSON escapes are TOML escapes, but DEL must be escaped too"""
+    return json.dumps(text, ensure_ascii=False).replace('\x7f', '\\u007f')
+
+
+def write_toml(networks: Iterable[NETWORK_TYPE], output: str) -> None:
+    """
+    Write networks as a configuration, checked against the schema
+    Written directly (values are only strings and booleans): tomlkit takes more time than the import of thousands of
+    networks.
+    :param networks: the networks, with unique names
+    :param output: path of the configuration ; `-` for the standard output
+    """
+    config = dict(networks)
+    if not get_validator()(config):
+        raise click.ClickException('The imported configuration is not valid.')
+    with open_atomic(output, 'w', encoding='utf-8') as f:
+        for name, wifi in config.items():
+            f.write(f'[{name if TOML_BARE_KEY_RE.fullmatch(name) else dump_toml_string(name)}]\n')
+            for key, value in wifi.items():
+                f.write(f'{key} = {dump_toml_string(value) if isinstance(value, str) else str(value).lower()}\n')
+            f.write('\n')
@@ -1,13 +1,20 @@
 """
 All which is about the layout
 """
+import collections
+import contextlib
 import string
-from typing import Dict, Tuple, Union
+import threading
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, List, Set, Tuple, Union
 
-import aenum
 import fpdf
+from fpdf.fpdf import SubsetMap
+from fpdf.syntax import Name, create_stream as pdf_stream, iobj_ref as pdf_ref
+from fpdf.util import object_id_for_page
 
-import myhack
+import fontmetrics
+from colors import COLOR_TYPE, COLORDICT_TYPE, Colors
 from paths import font_path
 
 CM_TO_PT = 72 / 2.54
@@ -37,9 +44,6 @@ FONTS.update({
         'size': FONTS['mono']['size']
     },
 })
-COLOR_TYPE = Tuple[int, int, int]  # RGB
-COLORDICT_TYPE = Dict[str, COLOR_TYPE]
-COLORS: Union[COLORDICT_TYPE, None] = None
 TYPO_SPEC_TYPE = Dict[str, str]
 TYPOS_PASSWORD: Dict[str, TYPO_SPEC_TYPE] = {
     'numbers': {
@@ -63,6 +67,12 @@ TYPOS_PASSWORD: Dict[str, TYPO_SPEC_TYPE] = {
         'style': '',
     }
 }
+CHAR_SPEC_TYPE = Tuple[str, str, int, COLOR_TYPE, str]  # font family, font style, font size, color, displayed char
+CHAR_TABLE_TYPE = Tuple[Union[None, CHAR_SPEC_TYPE], ...]  # Indexed by code point
+CHAR_TABLES: Dict[str, CHAR_TABLE_TYPE] = {}  # By name of color set
+DISPLAYED_CHARS: Dict[str, str] = {  # Chars displayed by another one
+    ' ': '␣',
+}
 ICONS: Dict[str, str] = {
     'wifi': '\ue63e',
     'passwd': '\ue897',
@@ -71,116 +81,549 @@ ICONS: Dict[str, str] = {
     'no_passwd': '\ue641',
 }
 MARGIN = (2 * CM_TO_PT, 2 * CM_TO_PT, 2 * CM_TO_PT)
+FONT_FILES: Dict[str, str] = {  # FPDF font key (family in lower case + style) -> TTF file
+    'icons': font_path('material-design-icons-4.0.0', 'font', 'MaterialIcons-Regular.ttf'),
+    'notosans': font_path('NotoSans', 'NotoSans-Regular.ttf'),
+    'notosansB': font_path('NotoSans', 'NotoSans-Bold.ttf'),
+    'notosansI': font_path('NotoSans', 'NotoSans-Italic.ttf'),
+    'notosansBI': font_path('NotoSans', 'NotoSans-BoldItalic.ttf'),
+    'ptmono': font_path('PTMono', 'PTMono-Regular.ttf'),
+    'firacode': font_path('FiraCode6.2', 'ttf', 'FiraCode-Regular.ttf'),
+}
+FONT_INDEXES: Dict[str, int] = {fontkey: i for i, fontkey in enumerate(FONT_FILES, start=1)}  # Same in every PDF
+CARD_SNAPSHOT_TYPE = Dict[str, Any]  # See `PDF.snapshot_card`
+FORM_PREFIX = 'Form-'  # Of the names of the Form XObjects (see `PDF.draw_form`)
+IMPOSITIONS: Dict[int, Tuple[int, int, bool]] = {  # Cards per A4 page -> columns, rows, whether cards are rotated
+    1: (1, 1, False),
+    2: (1, 2, True),  # A5, landscape
+    4: (2, 2, False),  # A6
+    8: (2, 4, True),  # A7, landscape
+}
+TEXT_FIT_TYPE = Tuple[int, Tuple[str, ...]]  # font size, lines
+TEXT_FITS_MAXSIZE = 1024
+TEXT_FITS: 'collections.OrderedDict[tuple, TEXT_FIT_TYPE]' = collections.OrderedDict()
+TEXT_FITS_LOCK = threading.Lock()
+
+
+class IdentitySubsetMap(SubsetMap):
+    """
+    Encode chars by their code point in the font subsets, instead of by their order of use: so the content of a page
+    does not depend on the other cards of the document (see `PDF.snapshot_card`).
+    Chars beyond the BMP cannot be encoded this way, they get free codes from the end of the BMP.
+    """
+
+    def __init__(self, identities):
+        super().__init__(identities)
+        self.codes: Set[int] = set(self._map.values())
+        self.next_code = 0xFFFF
+        self.card_picks: Set[int] = set()  # Chars used by the current card
+
+    def pick(self, unicode: int) -> int:
+        self.card_picks.add(unicode)
+        code = self._map.get(unicode)
+        if code is None:
+            if unicode <= 0xFFFF:
+                code = unicode
+            else:
+                while self.next_code in self.codes:
+                    self.next_code -= 1
+                code = self.next_code
+            self._map[unicode] = code
+            self.codes.add(code)
+        return code
 
 
-def add_fonts(pdf: fpdf.FPDF) -> None:
-    """Include fonts into the PDF file"""
-    pdf.add_font('Icons', '', font_path('material-design-icons-4.0.0', 'font', 'MaterialIcons-Regular.ttf'), True)
+class StreamBuffer(bytearray):
+    """
+    Buffer of a PDF written in a stream as it is generated: the flushed bytes are removed from the buffer, but they are
+    still counted in its length, which FPDF uses as the offset of the next object.
+    """
 
-    pdf.add_font('NotoSans', '', font_path('NotoSans', 'NotoSans-Regular.ttf'), True)
-    pdf.add_font('NotoSans', 'B', font_path('NotoSans', 'NotoSans-Bold.ttf'), True)
-    pdf.add_font('NotoSans', 'I', font_path('NotoSans', 'NotoSans-Italic.ttf'), True)
-    pdf.add_font('NotoSans', 'BI', font_path('NotoSans', 'NotoSans-BoldItalic.ttf'), True)
+    def __init__(self, stream: BinaryIO):
+        super().__init__()
+        self.stream = stream
+        self.flushed = 0
 
-    pdf.add_font('PTMono', '', font_path('PTMono', 'PTMono-Regular.ttf'), True)
+    def __len__(self):
+        return self.flushed + super().__len__()
 
-    pdf.add_font('Firacode', '', font_path('FiraCode6.2', 'ttf', 'FiraCode-Regular.ttf'), True)
+    def flush(self) -> None:
+        """Write the buffer in the stream, and empty it"""
+        self.stream.write(self)
+        self.stream.flush()
+        self.flushed += super().__len__()
+        del self[:]
 
 
-def get_char_font_spec(char: str) -> Tuple[TYPO_SPEC_TYPE, COLOR_TYPE, str]:
+class PDF(fpdf.FPDF):
     """
-    Determine the specification of the font for a char
-    :param char: the char
-    :return: A tuple of (
-        1. the spec of the typo
-        2. the color
-        3. the char (if it has to be displayed by another one)
-    )
+    A FPDF document which includes the fonts of `FONT_FILES` only once they are used.
+    The metrics of the fonts come from `fontmetrics`, so they are not parsed (or only once, without their tables).
+    Cards are drawn as if each one was alone on an A4 page, then scaled in the cells of a grid (see `card`).
+    Elements which are the same on many cards are drawn once, as Form XObjects (see `draw_form`).
+    Fonts have the same index and chars the same code in every document, so a card can be copied from one document
+    to another (see `snapshot_card` and `add_card_snapshot`).
+    If the PDF is streamed, each page is written as soon as the next one is started: memory does not grow with the
+    number of pages. Then, `output` must be called with the stream, to write the end of the document.
     """
-    if char in string.digits:
-        char_type = 'numbers'
-    elif char in string.ascii_lowercase:
-        char_type = 'lower'
-    elif char in string.ascii_uppercase:
-        char_type = 'upper'
-    elif char == ' ':
-        char_type = 'space'
-        char = '␣'
-    elif char in string.printable:
-        char_type = 'special'
+
+    def __init__(self, *args, per_page: int = 1, stream: Union[None, BinaryIO] = None, **kwargs):
+        """
+        :param per_page: number of cards per page ; a key of `IMPOSITIONS`
+        :param stream: where to write the PDF as it is generated, if any
+        """
+        self.per_page = per_page
+        self.cards_on_page = 0
+        self.card_start = 0  # Where the content of the current card starts in the one of its page
+        self.card_fonts: Set[str] = set()  # Keys of the fonts used by the current card
+        self.forms: Dict[str, Dict[str, Any]] = {}  # Elements drawn once, by name (see `draw_form`)
+        self.header_version: Union[None, str] = None  # PDF version written in the header, once it is written
+        self.pages_written = 0
+        super().__init__(*args, **kwargs)
+        self.stream = stream
+        if stream is not None:
+            self.buffer = StreamBuffer(stream)
+            # Pages are written before the images which need transparency are known: assume they do, as they will
+            self._set_min_pdf_version('1.4')
+
+    def set_font(self, family=None, style="", size=0):
+        fontkey = (family or self.font_family).lower() + "".join(sorted(style.upper().replace('U', '')))
+        if fontkey not in self.fonts and fontkey in FONT_FILES:
+            self.add_font(family or self.font_family, style.upper().replace('U', ''), FONT_FILES[fontkey])
+        super().set_font(family, style, size)
+        if self.page > 0:
+            self.card_fonts.add(self.current_font['fontkey'])
+
+    def add_font(self, family, style="", fname=None, uni="DEPRECATED"):
+        style = "".join(sorted(style.upper()))
+        fontkey = f"{family.lower()}{style}"
+        if fontkey in self.fonts or fontkey in self.core_fonts:
+            return
+
+        metrics = fontmetrics.get_font_metrics(fname)
+        sbarr = "\x00 "
+        if self.str_alias_nb_pages:
+            sbarr += "0123456789" + self.str_alias_nb_pages
+        self.fonts[fontkey] = {
+            "i": FONT_INDEXES.get(fontkey, len(FONT_INDEXES) + len(self.fonts) + 1),
+            "type": "TTF",
+            "name": metrics['name'],
+            "desc": metrics['desc'],
+            "up": metrics['up'],
+            "ut": metrics['ut'],
+            "cw": metrics['cw'],
+            "ttffile": fname,
+            "fontkey": fontkey,
+            "subset": IdentitySubsetMap(map(ord, sbarr)),
+        }
+        self.font_files[fontkey] = {
+            "length1": metrics['originalsize'],
+            "type": "TTF",
+            "ttffile": fname,
+        }
+
+    @contextlib.contextmanager
+    def card(self):
+        """
+        Draw a card in the next cell of the grid, adding a page when the current one is full.
+        In the context, the card is drawn as if it was alone on an A4 page: with the same coordinates, margins and font
+        sizes ; they are scaled (and rotated for landscape cells) by the transformation matrix of the cell.
+        With one card per page, cards are drawn in their page, without any transformation.
+        """
+        self.card_fonts = set()
+        for font in self.fonts.values():
+            font['subset'].card_picks.clear()
+        if self.page == 0 or self.cards_on_page == self.per_page:
+            self.add_page()
+            self.cards_on_page = 0
+        cell = self.cards_on_page
+        self.cards_on_page += 1
+
+        if self.per_page == 1:
+            self.card_start = 0  # The card is its page
+            yield
+            return
+
+        columns, rows, rotated = IMPOSITIONS[self.per_page]
+        cell_width, cell_height = self.w_pt / columns, self.h_pt / rows
+        left = cell % columns * cell_width
+        bottom = self.h_pt - (cell // columns + 1) * cell_height
+        if rotated:  # The top of the card is on the left of the cell
+            scale = cell_height / self.w_pt
+            matrix = (0, scale, -scale, 0, left + cell_width, bottom)
+        else:
+            scale = cell_width / self.w_pt
+            matrix = (scale, 0, 0, scale, left, bottom)
+
+        auto_page_break = self.auto_page_break
+        self.set_auto_page_break(False, self.b_margin)  # A card must stay in its cell
+        with self.local_context():
+            self._out(' '.join(f'{value:.4f}' for value in matrix) + ' cm')
+            self.card_start = len(self.pages[self.page]['content'])
+            # Fonts and colors are chosen again by the card
+            self.font_family, self.font_style, self.font_size_pt, self.current_font = '', '', 0, {}
+            self.set_xy(self.l_margin, self.t_margin)
+            yield
+        self.set_auto_page_break(auto_page_break, self.b_margin)
+
+    def get_card_fonts(self) -> Union[None, Dict[str, List[int]]]:
+        """Return the chars used by the current card, by font ; None if some are beyond the BMP"""
+        fonts = {}
+        for fontkey in sorted(self.card_fonts):
+            picks = self.fonts[fontkey]['subset'].card_picks
+            if any(unicode > 0xFFFF for unicode in picks):
+                return None
+            fonts[fontkey] = sorted(picks)
+        return fonts
+
+    def get_graphics_states(self, content: bytes) -> Dict[str, str]:
+        """Return the graphics states used by some content, by name"""
+        return {
+            str(name): state_dict
+            for state_dict, name in self._drawing_graphics_state_registry.items()
+            if f'/{name} gs'.encode() in content
+        }
+
+    def draw_form(self, name: str, draw: Callable[[], None]) -> None:
+        """
+        Draw an element which is the same on many cards as a Form XObject: it is drawn (by `draw`) only the first time,
+        then it is only referenced.
+        The element is drawn with the coordinates of a card, from a blank graphics state.
+        :param name: name of the element, used as the name of the XObject
+        :param draw: draw the element
+        """
+        if name not in self.forms:
+            page = self.pages[self.page]
+            card_content, card_fonts = page['content'], self.card_fonts
+            card_picks = {fontkey: set(font['subset'].card_picks) for fontkey, font in self.fonts.items()}
+            page['content'], self.card_fonts = bytearray(), set()
+            for font in self.fonts.values():
+                font['subset'].card_picks.clear()
+            self._push_local_stack()
+            self.font_family, self.font_style, self.font_size_pt, self.current_font = '', '', 0, {}
+            try:
+                draw()
+                content = bytes(page['content'])
+                self.forms[name] = {
+                    'content': content,
+                    'fonts': self.get_card_fonts(),
+                    'graphics_states': self.get_graphics_states(content),
+                }
+            finally:
+                self._pop_local_stack()
+                page['content'] = card_content
+                self.card_fonts |= card_fonts
+                for fontkey, picks in card_picks.items():
+                    self.fonts[fontkey]['subset'].card_picks |= picks
+        self._out(f'/{FORM_PREFIX}{name} Do')
+
+    def _putimages(self):
+        super()._putimages()
+        for form in self.forms.values():
+            content = zlib.compress(form['content']) if self.compress else form['content']
+            form['n'] = self._newobj()
+            self._out(f"<</Type /XObject /Subtype /Form /BBox [0 0 {self.w_pt:.2f} {self.h_pt:.2f}] "
+                      f"/Resources {pdf_ref(2)} {'/Filter /FlateDecode ' if self.compress else ''}"
+                      f"/Length {len(content)}>>")
+            self._out(pdf_stream(content))
+            self._out("endobj")
+
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for name, form in self.forms.items():
+            self._out(f"/{FORM_PREFIX}{name} {pdf_ref(form['n'])}")
+
+    def _beginpage(self, *args, **kwargs):
+        if self.stream is not None and self.page > 0:
+            self.write_pages()
+        super()._beginpage(*args, **kwargs)
+
+    def write_pages(self) -> None:
+        """Write the pages which are finished (all but the current one) in the stream"""
+        self._putheader()
+        for page in range(self.pages_written + 1, self.page + 1):
+            self._putpage(page)
+        self.pages_written = self.page
+        self.buffer.flush()
+
+    def _putheader(self):
+        if self.header_version is None:
+            super()._putheader()
+            self.header_version = self.pdf_version
+
+    def _putpage(self, n: int) -> None:
+        """Write a page and its content, as `_putpages` does, then forget its content"""
+        if self.annots[n] or self.annots_as_obj[n]:
+            raise ValueError('Annotations cannot be written in a stream')
+        page = self.pages[n]
+        self._newobj()
+        self._out("<</Type /Page")
+        self._out(f"/Parent {pdf_ref(1)}")
+        w_pt, h_pt = page["w_pt"], page["h_pt"]
+        dw_pt, dh_pt = (self.dw_pt, self.dh_pt) if self.def_orientation == "P" else (self.dh_pt, self.dw_pt)
+        if w_pt != dw_pt or h_pt != dh_pt:
+            self._out(f"/MediaBox [0 0 {w_pt:.2f} {h_pt:.2f}]")
+        self._out(f"/Resources {pdf_ref(2)}")
+        if self.pdf_version > "1.3":
+            self._out("/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>")
+        self._out(f"/Contents {pdf_ref(self.n + 1)}>>")
+        self._out("endobj")
+
+        content = zlib.compress(page["content"]) if self.compress else page["content"]
+        self._newobj()
+        self._out(f"<<{'/Filter /FlateDecode ' if self.compress else ''}/Length {len(content)}>>")
+        self._out(pdf_stream(content))
+        self._out("endobj")
+        page["content"] = bytearray()
+
+    def _putpages(self):
+        if self.stream is None:
+            super()._putpages()
+            return
+
+        for page in range(self.pages_written + 1, self.pages_count + 1):
+            self._putpage(page)
+        self.pages_written = self.pages_count
+        dw_pt, dh_pt = (self.dw_pt, self.dh_pt) if self.def_orientation == "P" else (self.dh_pt, self.dw_pt)
+        self.offsets[1] = len(self.buffer)
+        self._out("1 0 obj")
+        self._out("<</Type /Pages")
+        self._out("/Kids [" + " ".join(pdf_ref(object_id_for_page(page))
+                                       for page in range(1, self.pages_count + 1)) + "]")
+        self._out(f"/Count {self.pages_count}")
+        self._out(f"/MediaBox [0 0 {dw_pt:.2f} {dh_pt:.2f}]")
+        self._out(">>")
+        self._out("endobj")
+
+    def _putcatalog(self, *args, **kwargs):
+        super()._putcatalog(*args, **kwargs)
+        if self.pdf_version > self.header_version:  # Raised by a page written after the header
+            self._out(f"/Version /{self.pdf_version}")
+
+    def snapshot_card(self) -> Union[None, CARD_SNAPSHOT_TYPE]:
+        """
+        Copy the current card, to add it to another document
+        :return: the snapshot ; None if the card cannot be copied (it uses chars beyond the BMP)
+        """
+        content = bytes(self.pages[self.page]['content'][self.card_start:])
+        fonts = self.get_card_fonts()
+        if fonts is None:
+            return None
+        graphics_states = self.get_graphics_states(content)
+        forms = {}
+        for name, form in self.forms.items():
+            if f'/{FORM_PREFIX}{name} Do'.encode() not in content:
+                continue
+            if form['fonts'] is None:
+                return None
+            forms[name] = {
+                'content': form['content'].decode('latin-1'),
+                'fonts': form['fonts'],
+                'graphics_states': form['graphics_states'],
+            }
+            for fontkey, picks in form['fonts'].items():
+                fonts[fontkey] = sorted(set(fonts.get(fontkey, ())).union(picks))
+            graphics_states.update(form['graphics_states'])
+        return {
+            'content': content,
+            'fonts': fonts,
+            'graphics_states': graphics_states,
+            'forms': forms,
+            'pdf_version': self.pdf_version,
+        }
+
+    def add_card_snapshot(self, snapshot: CARD_SNAPSHOT_TYPE) -> bool:
+        """
+        Draw the current card by copying it from another document
+        :param snapshot: what `snapshot_card` returned, for the same number of cards per page
+        :return: whether the card has been drawn ; it cannot if its graphics states have other names in this document
+        """
+        registry = self._drawing_graphics_state_registry
+        for name, state_dict in snapshot['graphics_states'].items():
+            if registry.get(state_dict, name) != name:
+                return False
+            if state_dict not in registry and name != f'GS{len(registry)}':
+                return False
+        for name, state_dict in snapshot['graphics_states'].items():
+            registry.setdefault(state_dict, Name(name))
+
+        self._set_min_pdf_version(snapshot['pdf_version'])
+        for fontkey, picks in snapshot['fonts'].items():
+            if fontkey not in self.fonts:
+                self.add_font(fontkey.rstrip('BIU'), fontkey[len(fontkey.rstrip('BIU')):], FONT_FILES[fontkey])
+            subset = self.fonts[fontkey]['subset']
+            for unicode in picks:
+                subset.pick(unicode)
+        for name, form in snapshot['forms'].items():
+            self.forms.setdefault(name, dict(form, content=form['content'].encode('latin-1')))
+        self.pages[self.page]['content'][self.card_start:] = snapshot['content']
+        return True
+
+
+def wrap_words(widths: List[float], space_width: float, scale: float, max_width: float,
+               max_line: int) -> Union[None, List[int]]:
+    """
+    Greedily wrap words in lines
+    :param widths: width of each word, at a unit size
+    :param space_width: width of a space, at a unit size
+    :param scale: the factor from the unit size to the tested size
+    :param max_width: maximal width of a line
+    :param max_line: maximal number of lines
+    :return: the number of words of each line, or None if it does not fit
+    """
+    lines: List[int] = []
+    line_width = 0.
+    for width in widths:
+        if lines and (line_width + space_width + width) * scale <= max_width:
+            lines[-1] += 1
+            line_width += space_width + width
+            continue
+        if len(lines) == max_line or width * scale > max_width:
+            return None
+        lines.append(1)
+        line_width = width
+    return lines
+
+
+def fit_text(pdf: fpdf.FPDF, text: str, max_width: float, max_font_size: int, max_line: int = 1,
+             style: str = "") -> TEXT_FIT_TYPE:
+    """
+    Find the biggest font size at which a text fits in `max_line` lines of `max_width`.
+    Words are measured once (string widths are proportional to the font size), then font sizes are binary-searched.
+    Results are cached.
+    :param pdf: the FPDF object, whose current font family is the one to use
+    :param text: the text
+    :param max_width: the maximum width of a line
+    :param max_font_size: maximal font size to test
+    :param max_line: maximal number of lines
+    :param style: the style to apply (`B`, `I`, `BI`, ``)
+    :return: the font size, and the lines
+    """
+    key = (text, pdf.font_family, style, max_width, max_font_size, max_line, pdf.k)
+    with TEXT_FITS_LOCK:
+        fit = TEXT_FITS.get(key)
+        if fit is not None:
+            TEXT_FITS.move_to_end(key)
+            return fit
+
+    style = "".join(sorted(style.upper()))
+    fontkey = pdf.font_family + style
+    if fontkey in FONT_FILES:  # Measured without the font being loaded in the document
+        metrics = fontmetrics.get_font_metrics(FONT_FILES[fontkey])
+
+        def measure(string: str) -> float:
+            return fontmetrics.get_string_width(metrics, string)
     else:
-        raise Exception(f"Char '{char}' (unicode codepoint {ord(char)}) is not supported (yet) in WiFi password (so in "
-                        f"this program). ")
+        pdf.set_font(style=style)
 
-    return TYPOS_PASSWORD[char_type], COLORS[char_type], char
+        def measure(string: str) -> float:
+            return pdf.get_normalized_string_width_with_style(string, style)
 
+    whole_width = measure(text)
+    words = text.split(' ')
+    widths = [measure(word) for word in words]
+    space_width = measure(' ')
 
-class Colors(aenum.NamedConstant):
-    """Select colors"""
-    EVERYONE = {
-        'upper': (0x0c, 0x52, 0x75),
-        'lower': (0x09, 0x7d, 0xb8),
-        'numbers': (0xb3, 0x30, 0x00),
-        'special': (0x09, 0xb8, 0x32),
-        'space': (0x09, 0xb8, 0x32),
-    }
+    def fit_at(font_size: int) -> Union[None, Tuple[str, ...]]:
+        scale = font_size / pdf.k / 1000
+        if whole_width * scale <= max_width:
+            return (text,)
+        lines = wrap_words(widths, space_width, scale, max_width, max_line)
+        if lines is None:
+            return None
+        ret = []
+        start = 0
+        for count in lines:
+            ret.append(' '.join(words[start:start + count]))
+            start += count
+        return tuple(ret)
 
-    DEUTERANOPIA = {
-        'upper': (0x55, 0x5e, 0x75),
-        'lower': (0x5f, 0x7d, 0xbb),
-        'numbers': (0x00, 0x51, 0xb0),
-        'special': (0xaa, 0x99, 0x40),
-        'space': (0xaa, 0x99, 0x40),
-    }
-    PROTANOPIA = DEUTERANOPIA
-
-    TRITANOPIA = {
-        'upper': (0x00, 0x70, 0x6e),
-        'lower': (0x00, 0xa9, 0xa5),
-        'numbers': (0xfd, 0x00, 0x13),
-        'special': (0xcd, 0x5e, 0x8e),
-        'space': (0xcd, 0x5e, 0x8e),
-    }
+    fit = None
+    low, high = 1, max_font_size
+    while low <= high:
+        font_size = (low + high) // 2
+        lines = fit_at(font_size)
+        if lines is None:
+            high = font_size - 1
+        else:
+            fit = (font_size, lines)
+            low = font_size + 1
 
-    BLACK_WHITE = {
-        'upper': (0x00, 0x00, 0x00),
-        'lower': (0x25, 0x25, 0x25),
-        'numbers': (0x50, 0x50, 0x50),
-        'special': (0x75, 0x75, 0x75),
-        'space': (0x75, 0x75, 0x75),
-    }
+    if fit is None:
+        raise NotImplementedError('This should never happen.')
 
-    @property
-    def name(self):
-        return self._name_
+    with TEXT_FITS_LOCK:
+        TEXT_FITS[key] = fit
+        if len(TEXT_FITS) > TEXT_FITS_MAXSIZE:
+            TEXT_FITS.popitem(last=False)
+    return fit
 
-    @property
-    def value(self):
-        return self._value_
 
-    @classmethod
-    def default(cls):
-        return cls.EVERYONE
+class UnsupportedCharError(Exception):
+    """A char which cannot be written in a password"""
 
-    @classmethod
-    def from_string(cls, label: str):
-        return cls._members_[label.upper()]
+    def __init__(self, char: str):
+        super().__init__(f"Char '{char}' (unicode codepoint {ord(char)}) is not supported (yet) in WiFi password (so "
+                         f"in this program). ")
+        self.char = char
 
-    def __eq__(self, other) -> bool:
-        print(self.__dict__)
-        if not isinstance(other, type(self)):
-            return self.value == other
-        return self.value == other.value and self.name == other.name
 
-    @classmethod
-    @myhack.run_once
-    def list(cls):
-        return list(map(lambda x: x.name, cls))
+def get_char_type(char: str) -> str:
+    """
+    Classify a char of a password
+    :param char: the char
+    :return: its type, a key of `TYPOS_PASSWORD`
+    """
+    if char in string.digits:
+        return 'numbers'
+    elif char in string.ascii_lowercase:
+        return 'lower'
+    elif char in string.ascii_uppercase:
+        return 'upper'
+    elif char == ' ':
+        return 'space'
+    elif char in string.printable:
+        return 'special'
+    raise UnsupportedCharError(char)
+
+
+def build_char_table(colors: COLORDICT_TYPE) -> CHAR_TABLE_TYPE:
+    """
+    Resolve the spec of every supported char, for a color set
+    :param colors: the color set
+    :return: the specs of chars, indexed by code point ; `None` for unsupported chars
+    """
+    table: List[Union[None, CHAR_SPEC_TYPE]] = [None] * (max(map(ord, string.printable)) + 1)
+    for char in string.printable:
+        char_type = get_char_type(char)
+        typo = TYPOS_PASSWORD[char_type]
+        font = FONTS[typo['font-id']]
+        display = DISPLAYED_CHARS.get(char, char)
+        table[ord(char)] = (font['fam'], typo['style'], font['size'], colors[char_type], display)
+    return tuple(table)
+
+
+def get_char_specs(password: str, table: CHAR_TABLE_TYPE) -> List[CHAR_SPEC_TYPE]:
+    """
+    Determine the specification of the font of every char of a password, checking they are all supported
+    :param password: the password
+    :param table: the table of the color set to use (see `get_char_table`)
+    :return: for each char, a tuple of (font family, font style, font size, color, char to display)
+    """
+    try:
+        specs = [table[ord(char)] for char in password]
+    except IndexError:
+        specs = [None]
+    if None in specs:
+        for char in password:
+            if ord(char) >= len(table) or table[ord(char)] is None:
+                raise UnsupportedCharError(char)
+    return specs
 
-    def install(self):
-        """Define the color set defined in `self` as the one to use"""
-        global COLORS
-        COLORS = self.value
 
-    def casefold(self) -> str:
-        return self.name.casefold()
+def get_char_table(colors: Colors) -> CHAR_TABLE_TYPE:
+    """Return the specs of chars for a color set (see `build_char_table`), built only once"""
+    table = CHAR_TABLES.get(colors.name)
+    if table is None:
+        table = CHAR_TABLES[colors.name] = build_char_table(colors.value)
+    return table
@@ -1,76 +1,113 @@
-from typing import Union, Dict
+"""
+Command line interface
+
+Rendering dependencies (fpdf, qrcode, jschon, tomlkit...) are heavy: they are only imported by the commands which
+need them, so that `--help` and argument errors are quick.
+"""
+import os
+from typing import Union, Iterable, Tuple, Mapping, TextIO, List
 
-import aenum
 import click
-import fpdf
-import fpdf.drawing
-import qrcode
-import qrcode.image.svg
-
-import myhack
-from config import MyString, get_config_from_file
-from i18n import _, get_translations, install_translation, DEFAULT_LANGUAGE
-from layout import MARGIN, add_fonts, INTERLINE_SPACING, FONTS, ICONS, get_char_font_spec, Colors
-
-
-class WifiSecurity(aenum.NamedConstant):
-    """Select Wi-Fi security to use"""
-    OPEN = 'Open'
-    ENHANCED_OPEN = 'Enhanced Open'  # FYI : The kind of "Open" which comes with WPA3. It enables the encryption :D
-    WEP = 'WEP'
-    WPA = 'WPA Personal'
-    WPA2PSK = 'WPA2 Personal'
-    WPA2 = WPA2PSK
-    WPA3PSK = 'WPA3 Personal'
-    WPA3 = WPA3PSK
-
-    @property
-    def name(self):
-        return self._name_
-
-    @property
-    def value(self):
-        return self._value_
-
-    @property
-    def is_open(self):
-        return self in [WifiSecurity.OPEN, WifiSecurity.ENHANCED_OPEN]
-
-    @classmethod
-    def from_string(cls, label: str):
-        return cls._members_[label.upper().replace('-', '').replace(' ', '_')]
-
-    def __eq__(self, other) -> bool:
-        if isinstance(other, type(self)):
-            other = other.value
-        return self.value == other
-
-    @classmethod
-    @myhack.run_once
-    def list(cls):
-        return list(map(lambda x: x.name, cls))
+
+from config import CONFIG_FORMATS, LazyChoice, MyString, iter_config_from_file
+from i18n import get_translations, DEFAULT_LANGUAGE
+
+
+def get_colors() -> List[str]:
+    from colors import Colors
+    return Colors.list()
+
+
+def get_qr_renderers() -> Tuple[str, ...]:
+    import qr
+    return qr.RENDERERS
+
+
+def get_qr_encoders() -> Tuple[str, ...]:
+    import qr
+    return qr.ENCODERS
+
+
+# Keys of `layout.IMPOSITIONS`, listed here so that `--help` does not import `layout` (see `get_per_page`)
+PER_PAGE_CHOICES: Tuple[str, ...] = ('1', '2', '4', '8')
+
+
+def get_per_page(per_page: str) -> int:
+    """Return the number of cards per page chosen, once checked against `layout.IMPOSITIONS`"""
+    from layout import IMPOSITIONS
+    if int(per_page) not in IMPOSITIONS:
+        raise click.BadParameter(f'{per_page} cards per page is not supported.', param_hint='--per-page')
+    return int(per_page)
+
+
+def get_image_formats() -> Tuple[str, ...]:
+    from export import IMAGE_FORMATS
+    return IMAGE_FORMATS
+
+
+def get_securities() -> List[str]:
+    from wifi import WifiSecurity
+    return WifiSecurity.list()
+
+
+def print_qr_cache_stats() -> None:
+    import card
+    if card.RENDERER is not None:
+        click.echo(card.RENDERER.qr_cache.stats(), err=True)
 
 
 @click.group('main')
-@click.option('--colors', type=click.Choice(choices=Colors.list(), case_sensitive=False),
-              default=Colors.default, callback=lambda _, __, x: Colors.from_string(x),
+@click.option('--colors', type=LazyChoice(get_colors, case_sensitive=False),
               help="Optimize colors for some kind of color-blind people, else it will be the most of people.")
-@click.option('--lang', type=click.Choice(choices=get_translations(), case_sensitive=False),
+@click.option('--lang', type=LazyChoice(get_translations, case_sensitive=False),
               default=DEFAULT_LANGUAGE,
               help="Select the translation to use. By default, the one used is the one of the system "
                    "where this script is used.")
-def main(colors: Colors, lang: str):
-    colors.install()
-    install_translation(lang)
+@click.option('--qr-renderer', type=LazyChoice(get_qr_renderers, case_sensitive=False),
+              help="How to draw QR codes (`vector` by default). `svg` is the former (and slower) way, kept as a "
+                   "fallback.")
+@click.option('--qr-encoder', type=LazyChoice(get_qr_encoders, case_sensitive=False),
+              help="How to encode QR codes (`qrcode` by default). `numpy` makes the same QR codes, faster, encoding many "
+                   "at once (install the `fast-qr` extra).")
+@click.option('--qr-cache-size', type=click.IntRange(min=0), default=1024, show_default=True,
+              help="Number of encoded QR codes to keep in memory.")
+@click.option('--qr-cache-dir', type=click.Path(file_okay=False, dir_okay=True, writable=True),
+              help="Also keep the encoded QR codes in this directory, to reuse them from one run to another. Beware: "
+                   "passwords can be read from it.")
+@click.option('--qr-cache-stats', is_flag=True, help="Print the hits and misses of the QR code cache at the end.")
+@click.option('--profile', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True),
+              help="Write the wall and CPU times of each stage, for each network, in this file, as Chrome trace events "
+                   "(to open in chrome://tracing or ui.perfetto.dev). Worker processes are not traced.")
+@click.pass_context
+def main(ctx: click.Context, colors: Union[None, str], lang: str, qr_renderer: Union[None, str],
+         qr_encoder: Union[None, str], qr_cache_size: int, qr_cache_dir: Union[None, str], qr_cache_stats: bool,
+         profile: Union[None, str]):
+    # Settings are installed by the commands rendering cards (see `card.setup`)
+    if qr_cache_stats:
+        ctx.call_on_close(print_qr_cache_stats)
+    if profile is not None:
+        import profiling
+        tracer = profiling.install()
+        ctx.call_on_close(lambda: tracer.write(profile))
+    ctx.obj = {
+        'colors': colors,
+        'lang': lang,
+        'qr_renderer': qr_renderer,
+        'qr_encoder': qr_encoder,
+        'qr_cache_size': qr_cache_size,
+        'qr_cache_dir': qr_cache_dir,
+    }
 
 
 @main.command('cli')
 @click.option('--password', type=MyString(minlen=8, maxlen=63), required=False)
 @click.option('--hidden', is_flag=True)
 @click.argument('ssid', type=MyString(minlen=1))
-@click.argument('security', type=click.Choice(WifiSecurity.list(), case_sensitive=False))
-@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True))
-def cli(ssid: str, security: WifiSecurity, output: str, password: str = None, hidden: bool = False) -> None:
+@click.argument('security', type=LazyChoice(get_securities, case_sensitive=False))
+@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True,
+                                          allow_dash=True))
+@click.pass_obj
+def cli(settings: dict, ssid: str, security: str, output: str, password: str = None, hidden: bool = False) -> None:
     """Generate PDF with data in command line."""
     config = {
         ssid: {
@@ -80,299 +117,150 @@ def cli(ssid: str, security: WifiSecurity, output: str, password: str = None, hi
     }
     if password is not None:
         config[ssid]['password'] = password
-    return generate(config, output)
+    return generate(config, output, settings=settings)
 
 
 @main.command('generate')
-@click.argument('config', type=click.File(mode="r", encoding='utf-8', lazy=True),
-                callback=lambda _, __, config_io: get_config_from_file(config_io))
-@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True))
-def from_file(config: dict, output: str) -> None:
+@click.argument('config', type=click.File(mode="r", encoding='utf-8', lazy=True))
+@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True,
+                                          allow_dash=True))
+@click.option('--format', 'config_format', type=click.Choice(choices=CONFIG_FORMATS, case_sensitive=False),
+              help="Format of the configuration. Guessed from its extension by default (TOML, if `-` is used to read "
+                   "the standard input). JSON Lines and CSV are read one network at a time.")
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of worker processes rendering the networks. Each one renders a shard of the configuration.")
+@click.option('--split', is_flag=True,
+              help="Write one PDF per shard, plus a JSON manifest, instead of merging them in a single PDF.")
+@click.option('--cache-dir', type=click.Path(file_okay=False, dir_okay=True, writable=True),
+              help="Keep the card of each network in this directory, and only render the networks which changed since "
+                   "the previous run. Beware: passwords can be read from it.")
+@click.option('--per-page', type=click.Choice(choices=PER_PAGE_CHOICES), default='1', show_default=True,
+              help="Number of cards per A4 page. Cards are scaled down (and turned for 2 and 8 cards per page) to fill "
+                   "a grid: less paper, smaller PDF.")
+@click.pass_obj
+def from_file(settings: dict, config: TextIO, output: str, config_format: Union[None, str] = None, jobs: int = 1,
+              split: bool = False, cache_dir: Union[None, str] = None, per_page: str = '1') -> None:
     """Generate PDF from a configuration file."""
-    return generate(config, output)
-
-
-def generate(config: dict, output: str) -> None:
-    """Generate PDF"""
-    pdf = fpdf.FPDF('P', 'pt', 'A4')
-    pdf.set_margins(*MARGIN)
-
-    # Setup metadata
-    pdf.set_creator('gitlab.com/ajabep/wifi-print-readable-passwd')
-    pdf.set_display_mode('fullpage')
-    pdf.set_title(_('Wi-Fi QRCode'))
-
-    # Setup fonts
-    add_fonts(pdf)
-
-    # Write wifi data
-    wifi_characteristics: Dict[str, str]
-    wifi_name: str
-    for wifi_name, wifi_characteristics in config.items():
-        wifi_characteristics = dict(**wifi_characteristics)
-        wifi_characteristics.setdefault('ssid', wifi_name)
-        wifi_characteristics['security'] = WifiSecurity.from_string(wifi_characteristics['security'])
-        add_wifi(pdf, **wifi_characteristics)
-
-    pdf.output(output, 'F')
-
-
-def add_qr_code(pdf: fpdf.FPDF, ssid: str, security: WifiSecurity, password: Union[None, str] = None,
-                hidden: bool = False):
-    """Add a QRCode to a PDF."""
-
-    def escape(clear: str):
-        """Escape a string to be integrated into the string to generate the QRCode."""
-        return clear \
-            .replace('\\/', "\\\\") \
-            .replace(':', "\\:") \
-            .replace(';', "\\;") \
-            .replace(',', "\\,") \
-            .replace('\"', "\\\"")
-
-    def get_qr_code_string() -> str:
-        """Generate the string to encode as a QRCode to be authenticated to the Wi-Fi."""
-        if security.is_open:
-            sec = 'none'
-        elif security == WifiSecurity.WEP:
-            sec = 'WEP'
-        elif security in [WifiSecurity.WPA, WifiSecurity.WPA2PSK]:
-            sec = 'WPA'
-        elif security == WifiSecurity.WPA3PSK:
-            sec = 'SAE'
-        else:
-            raise NotImplementedError('Crap! A case which is not expected!')
-
-        e_ssid = escape(ssid)
-
-        if password is None:
-            e_passwd = "None"  # nosec
-        else:
-            e_passwd = escape(password)
-
-        hidden_str = ''
-        if hidden:
-            hidden_str = 'H:true;'
-
-        return f"WIFI:S:{e_ssid};T:{sec};P:{e_passwd};{hidden_str}"
-
-    qr = qrcode.QRCode(
-        border=0,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        image_factory=qrcode.image.svg.SvgImage
-    )
-    qr.add_data(get_qr_code_string())
-    qr.make(fit=True)
-    pdf.set_fill_color(0, 0, 0)
-    img = qr.make_image(
-        fill_color="black",
-        back_color="white"
-    )
-
-    width = pdf.w_pt - MARGIN[0] - MARGIN[2]
-    svg_text = myhack.svg_abs_to_rel(img.to_string())
-    svg = fpdf.svg.SVGObject(svg_text)
-    svg.draw_to_page(pdf, MARGIN[0], MARGIN[1] * -1)  # * -1 == it pissed me off ; idk why 😠 ; help me plzzz
-    pdf.set_y(pdf.get_y() + width + MARGIN[1] + INTERLINE_SPACING)  # width == height : QR Code are square
-
-
-def add_wifi(pdf: fpdf.FPDF, ssid: str, security: WifiSecurity, password: Union[None, str] = None,
-             hidden: bool = False):
-    """Add a page with a Wi-Fi data in a PDF."""
-    pdf.add_page()
-
-    add_qr_code(pdf, ssid, security, password, hidden)
-
-    main_font_fam = FONTS['main']['fam']
-    main_font_size = FONTS['main']['size']
-    about_font_fam = FONTS['about']['fam']
-    about_font_size = FONTS['about']['size']
-    icon_font_fam = FONTS['icons']['fam']
-    icon_font_size = FONTS['icons']['size']
-    pdf.set_text_color(0, 0, 0)
-
-    pdf.set_font(icon_font_fam, size=icon_font_size)
-    pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['wifi'])
-    pdf.set_font(main_font_fam, size=main_font_size)
-    pdf.write(main_font_size + INTERLINE_SPACING, ' ' + ssid)
-    pdf.ln()
-
-    if security.is_open:
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font(icon_font_fam, size=icon_font_size)
-        pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['no_passwd'])
-        pdf.set_font(main_font_fam, size=main_font_size)
-        pdf.write(main_font_size + INTERLINE_SPACING, ' ')
-        pdf.write(main_font_size + INTERLINE_SPACING, _('No password'))
-    else:
-        pdf.set_font(icon_font_fam, size=icon_font_size)
-        pdf.write(icon_font_size + INTERLINE_SPACING, ICONS['passwd'])
-        pdf.set_font(main_font_fam, size=main_font_size)
-        pdf.write(main_font_size + INTERLINE_SPACING, ' ')
-        write_password(pdf, password)
-
-    if hidden:
-        mid_page = pdf.w / 2
-        rect_width = mid_page - INTERLINE_SPACING - (MARGIN[0] + MARGIN[2]) / 2
-        r1_content_height = main_font_size + about_font_size + INTERLINE_SPACING
-        r2_content_height = about_font_size * 3 + INTERLINE_SPACING * 2
-        rect_content_height = max(r1_content_height, r2_content_height)
-        rect_height = rect_content_height + INTERLINE_SPACING * 2
-
-        margin_bottom = MARGIN[1]
-        rect_org_y = pdf.h - margin_bottom - rect_height
-
-        pdf.set_fill_color(255, 255, 255)
-        pdf.set_text_color(0, 0, 0)
-
-        r1 = {
-            'org': fpdf.drawing.Point(MARGIN[0], rect_org_y),
-            'size': fpdf.drawing.Point(rect_width, rect_height),
-        }
-        r2 = {
-            'org': fpdf.drawing.Point(rect_width + MARGIN[0] + INTERLINE_SPACING * 2, rect_org_y),
-            'size': fpdf.drawing.Point(rect_width, rect_height),
-        }
-
-        path: fpdf.drawing.PaintedPath
-        with pdf.new_path() as path:
-            for rect in [r1, r2]:
-                path.add_path_element(
-                    fpdf.drawing.RoundedRectangle(
-                        corner_radii=fpdf.drawing.Point(rect_height / 4, rect_height / 4),
-                        **rect
-                    )
-                )
-
-        pdf.set_font(icon_font_fam, size=rect_content_height)
-        r1_icon_width = pdf.get_string_width(ICONS['security'])
-        pdf.text(
-            r1['org'].x + INTERLINE_SPACING,
-            rect_org_y + rect_content_height + INTERLINE_SPACING,  # Y coord to the bottom of the line
-            ICONS['security']
-        )
-        r2_icon_width = pdf.get_string_width(ICONS['hidden'])
-        pdf.text(
-            r2['org'].x + INTERLINE_SPACING,
-            rect_org_y + rect_content_height + INTERLINE_SPACING,
-            ICONS['hidden']
-        )
-
-        pdf.set_font(about_font_fam)
-        text_max_size(
-            pdf,
-            rect_width - INTERLINE_SPACING * 3 - r1_icon_width,
-            about_font_size,
-            r1['org'].x + INTERLINE_SPACING * 2 + r1_icon_width,
-            rect_org_y + INTERLINE_SPACING + about_font_size,
-            _('Security'),
-            style="B"
-        )
-        pdf.set_font(main_font_fam)
-        text_max_size(
-            pdf,
-            rect_width - INTERLINE_SPACING * 3 - r1_icon_width,
-            main_font_size,
-            r1['org'].x + INTERLINE_SPACING * 2 + r1_icon_width,
-            rect_org_y + INTERLINE_SPACING + about_font_size + main_font_size,
-            _("None") if security == WifiSecurity.OPEN else security.value
-        )
-        pdf.set_font(about_font_fam)
-        text_max_size(
-            pdf,
-            rect_width - INTERLINE_SPACING * 3 - r2_icon_width,
-            about_font_size,
-            r2['org'].x + INTERLINE_SPACING + r2_icon_width,
-            rect_org_y + INTERLINE_SPACING + about_font_size,
-            _('Hidden Wi-Fi'),
-            style="B"
-        )
-        text_max_size(
-            pdf,
-            rect_width - INTERLINE_SPACING * 3 - r2_icon_width,
-            about_font_size,
-            r2['org'].x + INTERLINE_SPACING + r2_icon_width,
-            rect_org_y + INTERLINE_SPACING + about_font_size * 2,
-            _('Not shown in the Wi-Fi list.'),
-            max_line=2,
-            interline=INTERLINE_SPACING,
-        )
-
-
-def text_max_size(pdf: fpdf.FPDF, width_text: int, max_font_size: int, x: float, y: float, text: str, max_line: int = 1,
-                  interline: Union[None, int] = None, style: str = "") -> None:
+    if split and output == '-':
+        raise click.BadParameter('`--split` writes one PDF per shard: it needs a path.', param_hint='OUTPUT')
+    settings = dict(settings, cache_dir=cache_dir, per_page=get_per_page(per_page))
+    return generate(iter_config_from_file(config, config_format), output, jobs=jobs, split=split, settings=settings)
+
+
+@main.command('export')
+@click.argument('config', type=click.File(mode="r", encoding='utf-8', lazy=True))
+@click.argument('directory', type=click.Path(file_okay=False, dir_okay=True, writable=True))
+@click.option('--format', 'config_format', type=click.Choice(choices=CONFIG_FORMATS, case_sensitive=False),
+              help="Format of the configuration. Guessed from its extension by default (TOML, if `-` is used to read "
+                   "the standard input).")
+@click.option('--image-format', type=LazyChoice(get_image_formats, case_sensitive=False), default='png',
+              show_default=True, help="Format of the images.")
+@click.option('--dpi', type=click.IntRange(min=1), default=150, show_default=True,
+              help="Resolution of PNG images (an A4 card is about 1240x1754 pixels at 150 DPI).")
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=os.cpu_count() or 1, show_default=True,
+              help="Number of worker processes rendering the images.")
+@click.pass_obj
+def export(settings: dict, config: TextIO, directory: str, config_format: Union[None, str] = None,
+           image_format: str = 'png', dpi: int = 150, jobs: int = 1) -> None:
+    """Export the card of each network as an image, in a directory. Only new or changed cards are rendered again."""
+    import export as exporter
+    exporter.export(iter_config_from_file(config, config_format), directory, image_format.lower(), dpi, jobs,
+                    settings)
+
+
+@main.command('watch')
+@click.argument('config', type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True))
+@click.option('--format', 'config_format', type=click.Choice(choices=CONFIG_FORMATS, case_sensitive=False),
+              help="Format of the configuration. Guessed from its extension by default.")
+@click.option('--per-page', type=click.Choice(choices=PER_PAGE_CHOICES), default='1', show_default=True,
+              help="Number of cards per A4 page.")
+@click.option('--cache-dir', type=click.Path(file_okay=False, dir_okay=True, writable=True),
+              help="Also keep the card of each network in this directory, for the next runs. Beware: passwords can be "
+                   "read from it.")
+@click.option('--interval', type=click.FloatRange(min=0.05), default=1.0, show_default=True,
+              help="Seconds between two checks of the configuration, if inotify cannot be used.")
+@click.option('--debounce', type=click.FloatRange(min=0), default=0.2, show_default=True,
+              help="Seconds the configuration has to stay the same before being read again.")
+@click.pass_obj
+def watch(settings: dict, config: str, output: str, config_format: Union[None, str] = None, per_page: str = '1',
+          cache_dir: Union[None, str] = None, interval: float = 1.0, debounce: float = 0.2) -> None:
+    """Generate PDF from a configuration file, and generate it again each time the file is saved."""
+    import watcher
+    settings = dict(settings, cache_dir=cache_dir, per_page=get_per_page(per_page))
+    watcher.watch(config, config_format, output, interval, debounce, settings)
+
+
+@main.command('import')
+@click.argument('sources', nargs=-1, required=True,
+                type=click.Path(exists=True, file_okay=True, dir_okay=True, readable=True))
+@click.argument('output', type=click.Path(exists=False, file_okay=True, dir_okay=False, writable=True,
+                                          allow_dash=True))
+@click.option('--to', 'output_format', type=click.Choice(choices=('pdf', 'toml'), case_sensitive=False),
+              help="What to write: the PDF of the networks, or their configuration (validated). Guessed from the "
+                   "extension of OUTPUT by default (a configuration for `.toml`, else a PDF).")
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=os.cpu_count() or 1, show_default=True,
+              help="Number of worker processes parsing the files.")
+@click.option('--cache-dir', type=click.Path(file_okay=False, dir_okay=True, writable=True),
+              help="Keep the card of each network in this directory, and only render the networks which changed since "
+                   "the previous run. Beware: passwords can be read from it.")
+@click.option('--per-page', type=click.Choice(choices=PER_PAGE_CHOICES), default='1', show_default=True,
+              help="Number of cards per A4 page.")
+@click.pass_obj
+def import_files(settings: dict, sources: Tuple[str, ...], output: str, output_format: Union[None, str] = None,
+                 jobs: int = 1, cache_dir: Union[None, str] = None, per_page: str = '1') -> None:
+    """
+    Import the networks of hostapd, wpa_supplicant and NetworkManager files (`hostapd.conf`, `wpa_supplicant.conf`,
+    `.nmconnection`), or of directories of them, and generate their PDF, or write their configuration.
+    """
+    import importer
+    networks = importer.import_networks(sources, jobs)
+    if (output_format or importer.guess_output_format(output)).lower() == 'toml':
+        importer.write_toml(networks, output)
+        return
+    settings = dict(settings, cache_dir=cache_dir, per_page=get_per_page(per_page))
+    return generate(networks, output, settings=settings)
+
+
+@main.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True,
+              help="Address to listen to. Beware: passwords are sent in clear text, keep it local.")
+@click.option('--port', type=click.IntRange(min=0, max=65535), default=8080, show_default=True,
+              help="Port to listen to (0 to pick a free one).")
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=os.cpu_count() or 1, show_default=True,
+              help="Number of worker processes, hence of configurations rendered at the same time.")
+@click.option('--max-pending', type=click.IntRange(min=1), default=64, show_default=True,
+              help="Number of requests being rendered or waiting to be. The next ones are refused.")
+@click.option('--max-size', type=click.IntRange(min=1), default=1024 * 1024, show_default=True,
+              help="Maximal size of a configuration, in bytes.")
+@click.pass_obj
+def serve(settings: dict, host: str, port: int, jobs: int, max_pending: int, max_size: int) -> None:
+    """Serve PDF over HTTP: POST a configuration (TOML, or JSON with a JSON content type) to get its PDF."""
+    import server
+    server.serve(host, port, jobs, max_pending, max_size, settings)
+
+
+def generate(config: Union[Mapping[str, Mapping], Iterable[Tuple[str, Mapping]]], output: str, jobs: int = 1,
+             split: bool = False, settings: Union[None, dict] = None) -> None:
     """
-    Write a text with the maximum font size which will never go beyond a defined size.
-    :param pdf: the FPDF object in which write
-    :param width_text: the maximum width of the desired text.
-    :param max_font_size: maximal font size to test
-    :param x: where write the text (x-axis)
-    :param y: where write the text (y-axis)
-    :param text: the text to write
-    :param max_line: If > 0, try to write the text on `max_line` lines.
-    :param interline: the size of interline spaces
-    :param style: the style to apply (`B`, `I`, `BI`, ``)
+    Generate PDF
+    :param config: the networks to print, by name ; or pairs of (name, characteristics), in order
+    :param output: path of the PDF to write ; `-` to write it in the standard output, as it is generated
+    :param jobs: number of worker processes to use
+    :param split: if True, write one PDF per shard and a manifest instead of a single PDF
+    :param settings: the settings of the `main` group, to set up the rendering
     """
-    while max_font_size > 0:
-        # Verify if we can write the text in only 1 line with the font size
-        pdf.set_font(size=max_font_size, style=style)
-        width = pdf.get_string_width(text)
-        if width <= width_text:
-            pdf.text(x, y, text)
-            break
-
-        # Else, try to wrap in line, and verify if it will be more than expected
-        text_words = text.split(' ')
-        lines = [[]]
-        line_id = 0
-        while len(text_words) > 0:
-            new_word = text_words.pop(0)
-            line_width = pdf.get_string_width(' '.join(lines[line_id] + [new_word]))
-            if line_width <= width_text:
-                lines[line_id].append(new_word)
-            else:
-                if line_id == max_line:
-                    break
-                line_id += 1
-                lines.append([new_word])
-
-        if len(text_words) == 0 and len(lines) <= max_line:
-            # Ok, we found a valid configuration, let's write if !
-            for line_id, line in enumerate(lines):
-                pdf.text(
-                    x,
-                    y + interline + line_id * max_font_size,
-                    ' '.join(line)
-                )
-            break
-
-        # Ok, we have to try another font_size
-        max_font_size -= 1
-
-    if max_font_size == 0:
-        raise NotImplementedError('This should never happen.')
-
-
-def write_password(pdf: fpdf.FPDF, password: str):
-    """Write the password with the right color and font(s) in a PDF."""
-    for char in password:
-        try:
-            font_spec, font_color, char = get_char_font_spec(char)
-        except Exception as e:
-            raise click.ClickException(f"Char '{char}' (U+{ord(char)}) is not supported (yet) in WiFi password (so in "
-                                       f"this program). ") from e
-
-        font_family: str = FONTS[
-            font_spec['font-id']
-        ]['fam']
-        font_size: int = FONTS[
-            font_spec['font-id']
-        ]['size']
-        font_style: str = font_spec['style']
-
-        pdf.set_font(font_family, font_style, font_size)
-        pdf.set_text_color(*font_color)
-        pdf.write(font_size + INTERLINE_SPACING, char)
+    networks = config.items() if isinstance(config, Mapping) else config
+    if jobs > 1 or split:
+        import batch
+        batch.generate(list(networks), output, jobs, split, settings)
+        return
+
+    import card
+    from myhack import open_atomic
+    card.setup(settings)
+    with open_atomic(output) as stream:  # The file is only replaced once the PDF is complete
+        card.build_pdf(networks, stream).output(stream)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,20 @@
 """
-Generate translations and compile them!
+Generate translations and compile them! Generate the validator of the configuration, and check it! Extract the metrics
+of the fonts!
 """
+import random
 from pathlib import Path
 
 import click
-from babel.messages.frontend import CommandLineInterface as BabelCLI
 
 BASE_DIR = Path(__file__).resolve().parent
 TRANSLATION_DIR = BASE_DIR / 'locale'
 TRANSLATION_DOMAIN = 'locale'
 BABEL_CONFIG_FILE = BASE_DIR / 'babel.cfg'
 MESSAGE_POT = TRANSLATION_DIR / 'message.pot'
+CONFIG_SCHEMA = BASE_DIR / 'config.schema'
+CONFIG_VALIDATOR = BASE_DIR / 'config_validator.py'
+CONFIG_VALIDATOR_POINTERS = ('#', '#/$defs/wifi')
 
 
 @click.group()
@@ -19,6 +23,8 @@ def main():
 
 
 def pybabel(*args):
+    from babel.messages.frontend import CommandLineInterface as BabelCLI
+
     argv = ['']  # Add "command name", because, initialy, it's a command line
 
     for v in args:
@@ -77,5 +83,104 @@ def compile():
     )
 
 
+def generate_validator() -> str:
+    from validator import generate_module
+
+    return generate_module(CONFIG_SCHEMA.read_text(encoding='utf-8'), CONFIG_VALIDATOR_POINTERS, '`config.schema`')
+
+
+@main.command()
+def validator():
+    """Generate the validator of the configuration from its schema."""
+    CONFIG_VALIDATOR.write_text(generate_validator(), encoding='utf-8')
+
+
+def random_wifi(rng: random.Random):
+    """Return a network, often valid, sometimes not, and sometimes not even a network"""
+    securities = ['Open', 'Enhanced Open', 'WEP', 'WPA', 'WPA2-PSK', 'WPA3-PSK']
+    anything = [None, True, 0, 1.5, '', 'x', [], {}, ['WPA'], {'a': 1}]
+
+    if rng.random() < 0.05:
+        return rng.choice(anything)
+    wifi = {
+        'ssid': rng.choice(['MyWifi', 'é', '']) if rng.random() < 0.95 else rng.choice(anything),
+        'security': rng.choice(securities + ['wpa', 'WPA4', 'Open ']) if rng.random() < 0.95 else rng.choice(anything),
+        'password': 'p' * rng.choice([0, 1, 7, 8, 9, 40, 62, 63, 64, 70]) if rng.random() < 0.9 else rng.choice(anything),
+        'hidden': rng.choice([True, False]) if rng.random() < 0.9 else rng.choice(anything),
+        'language': rng.choice(['fr', 'en', '']) if rng.random() < 0.9 else rng.choice(anything),
+        'comment': rng.choice(anything),
+    }
+    return {key: value for key, value in wifi.items() if rng.random() < (0.05 if key == 'comment' else 0.7)}
+
+
+def random_config(rng: random.Random):
+    """Return a configuration, often valid, sometimes not, and sometimes not even a configuration"""
+    if rng.random() < 0.02:
+        return rng.choice([None, 'config', 1, [], [{}]])
+    return {f'network{i}': random_wifi(rng) for i in range(rng.choice([0, 1, 1, 2, 3]))}
+
+
+@main.command('check-validator')
+@click.option('-n', '--count', type=click.IntRange(min=1), default=5000, show_default=True,
+              help='Number of random configurations to check.')
+@click.option('--seed', type=int, default=0, show_default=True, help='Seed of the random configurations.')
+def check_validator(count: int, seed: int):
+    """Check the validator of the configuration is up to date, and agrees with jschon on random configurations."""
+    import jschon
+    import config_validator
+
+    if CONFIG_VALIDATOR.read_text(encoding='utf-8') != generate_validator():
+        raise click.ClickException(f'`{CONFIG_VALIDATOR.name}` is out of date: run `make.py validator`.')
+
+    jschon.create_catalog('2020-12')
+    schema = jschon.JSONSchema.loadf(CONFIG_SCHEMA)
+    rng = random.Random(seed)
+    valid = 0
+    for _ in range(count):
+        config = random_config(rng)
+        expected = schema.evaluate(jschon.JSON(config)).valid
+        if config_validator.validate(config) != expected:
+            raise click.ClickException(f'Configuration {config!r} is {"" if expected else "not "}valid, according to '
+                                       f'jschon.')
+        valid += expected
+
+        # A network alone is valid if it is valid in a configuration
+        wifi = random_wifi(rng)
+        expected = schema.evaluate(jschon.JSON({'network': wifi})).valid
+        if config_validator.validate_defs_wifi(wifi) != expected:
+            raise click.ClickException(f'Network {wifi!r} is {"" if expected else "not "}valid, according to jschon.')
+    click.echo(f'{count} configurations and networks checked ({valid} valid configurations).')
+
+
+@main.command()
+def metrics():
+    """Extract the widths of the chars of the fonts into tables, to measure text without loading the fonts."""
+    from fontmetrics import build_tables
+    from layout import FONT_FILES
+
+    build_tables(FONT_FILES)
+
+
+@main.command('check-metrics')
+def check_metrics():
+    """Check the tables of the fonts are up to date, and give the same widths as the fonts."""
+    from fontcache import parse_font
+    from fontmetrics import load_table
+    from layout import FONT_FILES
+
+    for fontkey, ttf_path in FONT_FILES.items():
+        table = load_table(ttf_path)
+        if table is None:
+            raise click.ClickException(f'The table of `{fontkey}` is missing or out of date: run `make.py metrics`.')
+        expected = parse_font(ttf_path)
+        if {k: v for k, v in table.items() if k != 'cw'} != {k: v for k, v in expected.items() if k != 'cw'}:
+            raise click.ClickException(f'The metrics of `{fontkey}` differ from the font.')
+        if len(table['cw']) != len(expected['cw']) or any(
+                table['cw'][char] != width or type(table['cw'][char]) is not type(width)
+                for char, width in enumerate(expected['cw'])):
+            raise click.ClickException(f'The widths of `{fontkey}` differ from the font.')
+    click.echo(f'{len(FONT_FILES)} fonts checked.')
+
+
 if __name__ == '__main__':
     main()
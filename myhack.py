@@ -1,10 +1,14 @@
 """Some quick&dirty hack because of incomplete ...implementations..."""
+import contextlib
 import io
+import os
+import stat
+import tempfile
+import threading
 import xml.etree.ElementTree  # nosec
-from typing import List, Callable
+from typing import IO, Iterator, List, Callable, Union
 
-import fpdf.svg
-from defusedxml.ElementTree import fromstring as parse_xml_str
+import click
 
 HEIGHT_ATTRS: List[str] = [
     'height',
@@ -21,23 +25,57 @@ NO_UNIT_ATTRS: List[str] = [
 
 
 def run_once(f: Callable):
-    """Wrapper to execute a function only once and return always the same result."""
+    """Wrapper to execute a function only once and return always the same result, even if threads call it at once."""
+    lock = threading.Lock()
+
     def wrapper(*args, **kwargs):
         if not wrapper.has_run:
-            wrapper.has_run = True
-            wrapper.ret_val = f(*args, **kwargs)
+            with lock:
+                if not wrapper.has_run:
+                    wrapper.ret_val = f(*args, **kwargs)
+                    wrapper.has_run = True
         return wrapper.ret_val
 
     wrapper.has_run = False
     return wrapper
 
 
+@contextlib.contextmanager
+def open_atomic(output: str, mode: str = 'wb', encoding: Union[None, str] = None) -> Iterator[IO]:
+    """
+    Open a file to write, and only replace it once it is completely written: if writing fails, the previous file is
+    kept. Unlike click's `atomic=True`, which replaces the file even when writing fails.
+    :param output: path of the file ; `-` for the standard output, written as it goes
+    :param mode: `wb`, or `w` to write text
+    :param encoding: encoding of the text
+    """
+    if output == '-':
+        with click.open_file(output, mode, encoding=encoding) as f:
+            yield f
+        return
+
+    f = tempfile.NamedTemporaryFile(mode, encoding=encoding, dir=os.path.dirname(output) or '.',
+                                    prefix=f'.{os.path.basename(output)}.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            yield f
+        if os.path.exists(output):  # New files are only readable by the user (passwords are in them)
+            os.chmod(f.name, stat.S_IMODE(os.stat(output).st_mode))
+        os.replace(f.name, output)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(f.name)
+        raise
+
+
 def svg_abs_to_rel(svg_text: str) -> str:
     """
     Change abs length to relatives to the viewbox
     :param svg_text: the SVG as a string
     :return: The scaled SVG, as a string
     """
+    import fpdf.svg  # Heavy: only imported when needed
+    from defusedxml.ElementTree import fromstring as parse_xml_str
 
     svg_root: xml.etree.ElementTree.Element = parse_xml_str(svg_text)
     viewbox = svg_root.get('viewBox')
@@ -0,0 +1,143 @@
+"""
+Cache of the rendered cards, by network, so that only the networks which changed are rendered again
+
+A card is stored under the hash of everything which changes how it is rendered, as a snapshot of its content (see
+`layout.PDF.snapshot_card`): reusing it costs as much as copying it in the document.
+Beware: anyone reading the cache directory can read the passwords.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Mapping, Union
+
+import fpdf
+
+from colors import Colors
+from i18n import DEFAULT_LANGUAGE, resolve_language
+from layout import CARD_SNAPSHOT_TYPE
+from myhack import run_once
+from paths import CURRENT_DIR, LOCALE_PATH, font_path
+from wifi import WifiSecurity
+
+CACHE_FORMAT = 2
+# Files changing how a card is rendered
+RENDERING_SOURCES = ('card.py', 'colors.py', 'layout.py', 'qr.py', 'wifi.py')
+
+
+@run_once
+def get_tool_version() -> str:
+    """Return a hash of what renders the cards: FPDF, the rendering code, the fonts and the translations"""
+    digest = hashlib.sha256(fpdf.FPDF_VERSION.encode())
+    for source in RENDERING_SOURCES:
+        with open(os.path.join(CURRENT_DIR, source), 'rb') as f:
+            digest.update(f.read())
+    for directory in (font_path(), LOCALE_PATH):
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                if name.endswith(('.ttf', '.mo')):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    digest.update(f'{os.path.relpath(path, CURRENT_DIR)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+def get_document_inputs(settings: Mapping) -> list:
+    """Return what changes the rendering of every card, from the settings of the `main` group"""
+    colors = settings.get('colors')
+    return [
+        CACHE_FORMAT,
+        get_tool_version(),
+        (Colors.from_string(colors) if colors else Colors.default()).name,
+        resolve_language(settings.get('lang', DEFAULT_LANGUAGE)),
+        settings.get('qr_renderer'),
+        settings.get('per_page', 1),  # A card alone on its page also has the page set up in its content
+    ]
+
+
+def get_card_key(document_inputs: list, name: str, wifi: Mapping) -> str:
+    """
+    Hash the effective inputs of the card of a network
+    :param document_inputs: what changes the rendering of every card (see `get_document_inputs`)
+    :param name: the name of the network in the configuration
+    :param wifi: the characteristics of the network
+    :return: the key of the card
+    """
+    return hashlib.sha256(json.dumps(document_inputs + [
+        wifi.get('ssid', name),
+        WifiSecurity.from_string(wifi['security']).name,
+        wifi.get('password'),
+        bool(wifi.get('hidden', False)),
+        wifi.get('language'),  # The one of the document otherwise
+    ]).encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Cards of networks, stored in a directory"""
+
+    def __init__(self, directory: Union[None, str], settings: Mapping):
+        self.directory = directory
+        self.document_inputs = get_document_inputs(settings)
+
+    def get_key(self, name: str, wifi: Mapping) -> str:
+        """Return the key of the card of a network in the cache (see `get_card_key`)"""
+        return get_card_key(self.document_inputs, name, wifi)
+
+    def get_path(self, key: str) -> str:
+        """Return where the card of a key is stored"""
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key: str) -> Union[None, CARD_SNAPSHOT_TYPE]:
+        """Read a card, if it is cached"""
+        try:
+            with open(self.get_path(key), 'rb') as f:
+                snapshot = json.loads(f.readline())
+                snapshot['content'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return snapshot
+
+    def store(self, key: str, snapshot: CARD_SNAPSHOT_TYPE) -> None:
+        """Write a card, atomically and readable only by the user (passwords are in it)"""
+        path = self.get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(json.dumps({k: v for k, v in snapshot.items() if k != 'content'}).encode('utf-8') + b'\n')
+                f.write(snapshot['content'])
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # A read-only cache only costs some time
+
+
+class MemoryPageCache(PageCache):
+    """
+    Cards of networks, kept in memory by a long-running process (see `watcher`), and also stored in a directory if one
+    is given
+    """
+
+    def __init__(self, directory: Union[None, str], settings: Mapping):
+        super().__init__(directory, settings)
+        self.cards: Dict[str, CARD_SNAPSHOT_TYPE] = {}
+
+    def load(self, key: str) -> Union[None, CARD_SNAPSHOT_TYPE]:
+        """Return a card from memory, else read it from the directory, if any"""
+        snapshot = self.cards.get(key)
+        if snapshot is None and self.directory is not None:
+            snapshot = super().load(key)
+            if snapshot is not None:
+                self.cards[key] = snapshot
+        return snapshot
+
+    def store(self, key: str, snapshot: CARD_SNAPSHOT_TYPE) -> None:
+        """Keep a card in memory, and write it in the directory, if any"""
+        self.cards[key] = snapshot
+        if self.directory is not None:
+            super().store(key, snapshot)
+
+    def keep(self, keys: Iterable[str]) -> None:
+        """Forget the cards of the networks which are no longer printed"""
+        keys = set(keys)
+        for key in self.cards.keys() - keys:
+            del self.cards[key]
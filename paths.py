@@ -17,3 +17,17 @@ FONT_DIR = path('fonts')
 def font_path(*path_elements) -> str:
     """Return the path to an element from the font directory of this project."""
     return os.path.join(FONT_DIR, *path_elements)
+
+
+FONT_METRICS_DIR = font_path('metrics')
+
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'wifi-print-readable-passwd'
+)
+
+
+def cache_path(*path_elements) -> str:
+    """Return the path to an element from the cache directory of this project."""
+    return os.path.join(CACHE_DIR, *path_elements)
@@ -0,0 +1,97 @@
+"""
+Instrumentation of the generation, written as Chrome trace events (see `chrome://tracing` or ui.perfetto.dev)
+
+Nothing is instrumented until `install` is called: without profiling, the functions are the original ones.
+Callers have to look the instrumented functions up in their module when they call them (e.g. `card.build_pdf`):
+a function imported by name before `install` is the original one.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import card
+import config
+import layout
+import qr
+
+ARGS_TYPE = Callable[..., Dict[str, Any]]
+
+
+def describe_network(_: Any, ssid: str, *__: Any, **___: Any) -> Dict[str, Any]:
+    """Tell which network a call of `add_wifi` draws (never tell its password)"""
+    return {'ssid': ssid}
+
+
+# Functions to instrument: (module, name, category, args describing a call)
+STAGES: List[Tuple[types.ModuleType, str, str, Union[None, ARGS_TYPE]]] = [
+    (config, 'get_config_from_file', 'stage', None),
+    (card, 'build_pdf', 'stage', None),
+    (card, 'add_wifi', 'network', describe_network),
+    (card, 'add_qr_code', 'stage', None),
+    (card, 'text_max_size', 'stage', None),
+    (card, 'write_password', 'stage', None),
+    (qr, 'get_matrix', 'stage', None),
+]
+
+
+class Tracer:
+    """Record the wall and CPU times of function calls, as Chrome trace events"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.pid = os.getpid()
+
+    def wrap(self, f: Callable, category: str, describe: Union[None, ARGS_TYPE] = None) -> Callable:
+        """
+        Instrument a function
+        :param f: the function
+        :param category: category of the trace events
+        :param describe: return the arguments of a trace event from the ones of a call, if any
+        :return: the instrumented function
+        """
+        name = f.__name__
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                wall_duration, cpu_duration = time.perf_counter() - wall, time.thread_time() - cpu
+                event = {
+                    'name': name,
+                    'cat': category,
+                    'ph': 'X',
+                    'pid': self.pid,
+                    'tid': threading.get_ident(),
+                    'ts': wall * 1e6,
+                    'dur': wall_duration * 1e6,
+                    'tts': cpu * 1e6,
+                    'tdur': cpu_duration * 1e6,
+                    'args': {'cpu_ms': cpu_duration * 1e3},
+                }
+                if describe is not None:
+                    event['args'].update(describe(*args, **kwargs))
+                self.events.append(event)  # Atomic: threads do not have to be synchronized
+        return wrapper
+
+    def write(self, path: str) -> None:
+        """Write the trace events in a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+def install() -> Tracer:
+    """
+    Instrument the stages of the generation
+    :return: the tracer recording the calls
+    """
+    tracer = Tracer()
+    for module, name, category, describe in STAGES:
+        setattr(module, name, tracer.wrap(getattr(module, name), category, describe))
+    layout.PDF.output = tracer.wrap(layout.PDF.output, 'stage')
+    return tracer
@@ -0,0 +1,274 @@
+"""
+All which is about drawing QR codes
+"""
+import collections
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple, Union
+
+import click
+
+import myhack
+
+if TYPE_CHECKING:
+    import fpdf
+    import qrcode
+
+MATRIX_TYPE = List[List[bool]]
+RECT_TYPE = Tuple[int, int, int, int]  # x, y, width, height ; in modules
+RENDERERS: Tuple[str, ...] = ('vector', 'svg')
+DEFAULT_RENDERER = RENDERERS[0]
+# `numpy` makes the same QR codes as `qrcode`, faster, and encodes batches at once (see `qrnumpy`)
+ENCODERS: Tuple[str, ...] = ('qrcode', 'numpy')
+DEFAULT_ENCODER = ENCODERS[0]
+
+
+def make_qr_code(data: str) -> 'qrcode.QRCode':
+    """Encode data in a QR code, with the minimal error correction and no border."""
+    import qrcode  # Heavy: only imported when needed
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(
+        border=0,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        image_factory=qrcode.image.svg.SvgImage
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def encode(payloads: Sequence[str], encoder: str = DEFAULT_ENCODER) -> List[MATRIX_TYPE]:
+    """
+    Return the modules of the QR codes encoding payloads
+    :param payloads: the data to encode
+    :param encoder: one of `ENCODERS` ; `numpy` encodes them all at once
+    :return: the modules of each QR code, in the same order ; `True` is a dark module
+    """
+    if encoder == 'numpy':
+        try:
+            import qrnumpy  # Heavy: only imported when needed
+        except ImportError as e:
+            raise click.ClickException('The `numpy` QR code encoder requires `numpy` (install the `fast-qr` extra).') from e
+        return qrnumpy.encode_batch(payloads)
+    return [make_qr_code(payload).get_matrix() for payload in payloads]
+
+
+def pack_matrix(matrix: MATRIX_TYPE) -> bytes:
+    """Pack the modules of a QR code in bits, prefixed by its size"""
+    size = len(matrix)
+    bits = ''.join('1' if module else '0' for row in matrix for module in row)
+    return size.to_bytes(2, 'big') + int('1' + bits, 2).to_bytes((size * size) // 8 + 1, 'big')
+
+
+def unpack_matrix(packed: bytes) -> MATRIX_TYPE:
+    """Unpack what `pack_matrix` did"""
+    size = int.from_bytes(packed[:2], 'big')
+    bits = bin(int.from_bytes(packed[2:], 'big'))[3:]  # Skip '0b1'
+    if len(bits) != size * size:
+        raise ValueError('Corrupted QR code matrix')
+    return [[bit == '1' for bit in bits[i:i + size]] for i in range(0, size * size, size)]
+
+
+class MatrixCache:
+    """
+    LRU cache of the modules of QR codes, by encoded data, optionally backed by a directory. It can be shared by
+    threads.
+    Beware: anyone reading the directory can decode the passwords.
+    """
+
+    def __init__(self, maxsize: int = 1024, directory: Union[None, str] = None, encoder: str = DEFAULT_ENCODER):
+        """
+        :param maxsize: number of QR codes kept in memory
+        :param directory: where to also keep them, if any
+        :param encoder: how to encode the missing ones ; one of `ENCODERS`
+        """
+        if encoder not in ENCODERS:
+            raise ValueError(f'Unknown QR code encoder: {encoder}')
+        self.maxsize = maxsize
+        self.directory = directory
+        self.encoder = encoder
+        self.encoded: Dict[str, bytes] = {}  # Encoded in advance (see `prefetch`), until they are asked
+        self.matrices: 'collections.OrderedDict[str, bytes]' = collections.OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def disk_path(self, data: str) -> str:
+        """Return where a matrix is stored in the directory"""
+        return os.path.join(self.directory, hashlib.sha256(data.encode('utf-8')).hexdigest())
+
+    def load(self, data: str) -> Union[None, bytes]:
+        """Read a matrix from the directory, if any"""
+        if self.directory is None:
+            return None
+        try:
+            with open(self.disk_path(data), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, data: str, packed: bytes) -> None:
+        """Write a matrix in the directory, if any"""
+        if self.directory is None:
+            return
+        path = self.disk_path(data)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(packed)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # A read-only cache only costs some time
+
+    def get(self, data: str) -> MATRIX_TYPE:
+        """Return the modules of the QR code encoding data, encoding it only if it is not cached."""
+        with self.lock:
+            packed = self.matrices.get(data)
+            if packed is not None:
+                self.hits += 1
+                self.matrices.move_to_end(data)
+                return unpack_matrix(packed)
+
+            packed = self.encoded.pop(data, None)
+
+        # Loaded or encoded out of the lock: other threads can use the cache meanwhile
+        matrix = None
+        disk_hit = False
+        if packed is None:
+            packed = self.load(data)
+            if packed is not None:
+                try:
+                    matrix = unpack_matrix(packed)
+                    disk_hit = True
+                except ValueError:
+                    packed = None
+        else:
+            matrix = unpack_matrix(packed)
+        if packed is None:
+            matrix = encode([data], self.encoder)[0]
+            packed = pack_matrix(matrix)
+            self.store(data, packed)
+
+        with self.lock:
+            if disk_hit:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self.matrices[data] = packed
+            if len(self.matrices) > self.maxsize:
+                self.matrices.popitem(last=False)
+        return matrix
+
+    def prefetch(self, payloads: Sequence[str]) -> None:
+        """
+        Encode at once the QR codes which will be asked, and which are neither in memory nor in the directory. They
+        are kept until they are asked, and counted as misses then.
+        """
+        with self.lock:
+            missing = list(dict.fromkeys(
+                data for data in payloads if data not in self.matrices and data not in self.encoded
+            ))
+        if self.directory is not None:
+            missing = [data for data in missing if not os.path.exists(self.disk_path(data))]
+        if not missing:
+            return
+
+        packed = {}
+        for data, matrix in zip(missing, encode(missing, self.encoder)):
+            packed[data] = pack_matrix(matrix)
+            self.store(data, packed[data])
+        with self.lock:
+            self.encoded.update(packed)
+
+    def stats(self) -> str:
+        """Return the hit/miss counters, readable by a human"""
+        total = self.hits + self.disk_hits + self.misses
+        ratio = (self.hits + self.disk_hits) / total if total else 0
+        return (f'QR code cache: {self.hits} hits, {self.disk_hits} hits on disk, {self.misses} misses '
+                f'({ratio:.0%} hit ratio)')
+
+
+def get_matrix(data: str, cache: Union[None, MatrixCache] = None, encoder: str = DEFAULT_ENCODER) -> MATRIX_TYPE:
+    """
+    Return the modules of the QR code encoding data ; `True` is a dark module.
+    :param data: the data to encode
+    :param cache: the cache to get it from, if any ; it has its own encoder
+    :param encoder: one of `ENCODERS`, if there is no cache
+    """
+    if cache is None:
+        return encode([data], encoder)[0]
+    return cache.get(data)
+
+
+def merge_modules(matrix: MATRIX_TYPE) -> List[RECT_TYPE]:
+    """
+    Cover the dark modules of a QR code with as few rectangles as a scan-line can find.
+    Each row is cut in runs of dark modules, then a run is merged with the one of the previous row if they have the
+    same bounds.
+    :param matrix: the modules of the QR code
+    :return: the rectangles, as (x, y, width, height), in modules
+    """
+    rects: List[List[int]] = []
+    opened = {}  # (start, end) of a run -> its rectangle, if it continues the previous row
+    for y, row in enumerate(matrix):
+        still_opened = {}
+        x = 0
+        size = len(row)
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            rect = opened.get((start, x))
+            if rect is None:
+                rect = [start, y, x - start, 0]
+                rects.append(rect)
+            rect[3] += 1
+            still_opened[(start, x)] = rect
+        opened = still_opened
+    return [tuple(rect) for rect in rects]
+
+
+def draw_matrix(pdf: 'fpdf.FPDF', matrix: MATRIX_TYPE, x: float, y: float, size: float) -> None:
+    """
+    Draw a QR code as a single filled path, using the current fill color.
+    :param pdf: the FPDF object in which draw
+    :param matrix: the modules of the QR code
+    :param x: left of the QR code
+    :param y: top of the QR code
+    :param size: width (== height) of the QR code
+    """
+    module = size / len(matrix)
+    top = pdf.h - y
+    ops = [
+        f'{(x + rx * module) * pdf.k:.4f} {(top - (ry + rh) * module) * pdf.k:.4f} '
+        f'{rw * module * pdf.k:.4f} {rh * module * pdf.k:.4f} re'
+        for rx, ry, rw, rh in merge_modules(matrix)
+    ]
+    if ops:
+        pdf._out('\n'.join(ops) + '\nf')
+
+
+def draw_svg(pdf: 'fpdf.FPDF', data: str, x: float, y: float) -> None:
+    """
+    Draw a QR code by converting it to an SVG first (slow ; kept as a fallback).
+    :param pdf: the FPDF object in which draw
+    :param data: the data to encode
+    :param x: see `fpdf.svg.SVGObject.draw_to_page`
+    :param y: see `fpdf.svg.SVGObject.draw_to_page`
+    """
+    import fpdf.svg
+
+    img = make_qr_code(data).make_image(
+        fill_color="black",
+        back_color="white"
+    )
+    svg_text = myhack.svg_abs_to_rel(img.to_string())
+    svg = fpdf.svg.SVGObject(svg_text)
+    svg.draw_to_page(pdf, x, y)
@@ -0,0 +1,384 @@
+"""
+QR code encoder vectorized with NumPy, for batches of payloads
+
+It makes the same QR codes as `qrcode` (same segments, version, error correction and mask, hence the same modules), but
+the modules are placed, masked and scored as arrays: the 8 masks of all the payloads of the same version at once.
+The tables of the standard (blocks, capacities, alignment patterns) and the segmentation of the payloads are the ones
+of `qrcode`.
+"""
+import bisect
+import functools
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import qrcode.base
+import qrcode.constants
+import qrcode.exceptions
+import qrcode.util
+
+MATRIX_TYPE = List[List[bool]]
+TEMPLATE_TYPE = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]  # modules, rows, columns, masks of the data
+BATCH_SIZE = 256  # Payloads scored at once, to bound the memory: 26 kB by payload of version 10
+MASKS = (
+    lambda i, j: (i + j) % 2 == 0,
+    lambda i, j: i % 2 == 0,
+    lambda i, j: j % 3 == 0,
+    lambda i, j: (i + j) % 3 == 0,
+    lambda i, j: (i // 2 + j // 3) % 2 == 0,
+    lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
+    lambda i, j: ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+    lambda i, j: ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+)
+FINDER_PATTERN = np.array([  # With its separator
+    [1, 1, 1, 1, 1, 1, 1, 0],
+    [1, 0, 0, 0, 0, 0, 1, 0],
+    [1, 0, 1, 1, 1, 0, 1, 0],
+    [1, 0, 1, 1, 1, 0, 1, 0],
+    [1, 0, 1, 1, 1, 0, 1, 0],
+    [1, 0, 0, 0, 0, 0, 1, 0],
+    [1, 1, 1, 1, 1, 1, 1, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+], dtype=bool)
+ALIGNMENT_PATTERN = np.array([
+    [1, 1, 1, 1, 1],
+    [1, 0, 0, 0, 1],
+    [1, 0, 1, 0, 1],
+    [1, 0, 0, 0, 1],
+    [1, 1, 1, 1, 1],
+], dtype=bool)
+# Penalized patterns of the rule 3: 1:1:3:1:1 with 4 light modules after or before
+FINDER_LIKE_PATTERNS = (
+    np.array([1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0], dtype=bool),
+    np.array([0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1], dtype=bool),
+)
+
+
+def get_gf_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the exponentials and the logarithms of GF(256), with the polynomial of QR codes
+    The exponentials are repeated, to add 2 logarithms without modulo.
+    """
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    value = 1
+    for power in range(255):
+        exp[power] = exp[power + 255] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    return exp, log
+
+
+GF_EXP, GF_LOG = get_gf_tables()
+
+
+def get_format_positions(size: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Return the 2 places of each of the 15 bits of the format information, from the least significant one"""
+    vertical = [(i, 8) if i < 6 else (i + 1, 8) if i < 8 else (size - 15 + i, 8) for i in range(15)]
+    horizontal = [(8, size - i - 1) if i < 8 else (8, 15 - i) if i < 9 else (8, 15 - i - 1) for i in range(15)]
+    return vertical, horizontal
+
+
+def get_version_positions(size: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Return the 2 places of each of the 18 bits of the version information, from the least significant one"""
+    return ([(i // 3, i % 3 + size - 11) for i in range(18)],
+            [(i % 3 + size - 11, i // 3) for i in range(18)])
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(version: int) -> TEMPLATE_TYPE:
+    """
+    Return what does not depend on the data of a version
+    :return: the function patterns, with a blank format (and version) information, as `qrcode` scores the masks ; the
+    rows and columns of the data modules, in the order they are filled ; and the 8 masks of the data modules
+    """
+    size = version * 4 + 17
+    modules = np.zeros((size, size), dtype=bool)
+    reserved = np.zeros((size, size), dtype=bool)
+
+    for row, col in ((0, 0), (size - 7, 0), (0, size - 7)):
+        # The separator is on the side of the finder pattern which is inside the symbol
+        pattern = FINDER_PATTERN[::1 if row == 0 else -1, ::1 if col == 0 else -1]
+        top, left = max(row - 1, 0), max(col - 1, 0)
+        modules[top:top + 8, left:left + 8] = pattern
+        reserved[top:top + 8, left:left + 8] = True
+
+    positions = qrcode.util.pattern_position(version)
+    for row in positions:
+        for col in positions:
+            if reserved[row, col]:  # Over a finder pattern
+                continue
+            modules[row - 2:row + 3, col - 2:col + 3] = ALIGNMENT_PATTERN
+            reserved[row - 2:row + 3, col - 2:col + 3] = True
+
+    for i in range(8, size - 8):  # Timing patterns, where the alignment patterns are not
+        if not reserved[i, 6]:
+            modules[i, 6] = i % 2 == 0
+        if not reserved[6, i]:
+            modules[6, i] = i % 2 == 0
+    reserved[8:size - 8, 6] = True
+    reserved[6, 8:size - 8] = True
+
+    information = get_format_positions(size) + (get_version_positions(size) if version >= 7 else ())
+    for row, col in (position for positions in information for position in positions):
+        reserved[row, col] = True
+    reserved[size - 8, 8] = True  # The dark module, light while the masks are scored
+
+    # Data modules, in 2 modules wide columns, from the right, going up then down
+    rows: List[int] = []
+    cols: List[int] = []
+    upward = True
+    for right in range(size - 1, 0, -2):
+        if right <= 6:  # Skip the vertical timing pattern
+            right -= 1
+        for row in (range(size - 1, -1, -1) if upward else range(size)):
+            for col in (right, right - 1):
+                if not reserved[row, col]:
+                    rows.append(row)
+                    cols.append(col)
+        upward = not upward
+    rows_array = np.array(rows, dtype=np.intp)
+    cols_array = np.array(cols, dtype=np.intp)
+    masks = np.array([mask(rows_array, cols_array) for mask in MASKS], dtype=bool)
+    return modules, rows_array, cols_array, masks
+
+
+@functools.lru_cache(maxsize=None)
+def get_generator(ec_count: int) -> np.ndarray:
+    """Return the logarithms of the coefficients of the Reed-Solomon generator polynomial, but the leading one"""
+    generator = [1]
+    for i in range(ec_count):  # Multiply by (x - a^i)
+        root = int(GF_EXP[i])
+        generator = [a ^ (int(GF_EXP[GF_LOG[b] + GF_LOG[root]]) if b else 0)
+                     for a, b in zip(generator + [0], [0] + generator)]
+    return GF_LOG[np.array(generator[1:])]
+
+
+def get_error_correction(data: np.ndarray, ec_count: int) -> np.ndarray:
+    """
+    Compute the Reed-Solomon error correction codewords of blocks of the same length
+    :param data: the data codewords, one block per row
+    :param ec_count: number of error correction codewords by block
+    :return: the error correction codewords, one block per row
+    """
+    generator = get_generator(ec_count)
+    remainder = np.zeros((data.shape[0], ec_count), dtype=np.int32)
+    for i in range(data.shape[1]):
+        factor = data[:, i] ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        nonzero = factor != 0
+        remainder[nonzero] ^= GF_EXP[GF_LOG[factor[nonzero]][:, None] + generator[None, :]]
+    return remainder
+
+
+@functools.lru_cache(maxsize=None)
+def get_blocks(version: int, error_correction: int) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """
+    Return the blocks of a version, and how to interleave their codewords
+    :return: the (data count, error correction count) of each block ; and the permutation putting the codewords of the
+    blocks, data then error correction, in the order they are placed
+    """
+    blocks = [(block.data_count, block.total_count - block.data_count)
+              for block in qrcode.base.rs_blocks(version, error_correction)]
+    data_offsets = np.cumsum([0] + [dc for dc, _ in blocks])
+    ec_offsets = data_offsets[-1] + np.cumsum([0] + [ec for _, ec in blocks])
+    order = [data_offsets[b] + i for i in range(max(dc for dc, _ in blocks))
+             for b, (dc, _) in enumerate(blocks) if i < dc]
+    order += [ec_offsets[b] + i for i in range(max(ec for _, ec in blocks))
+              for b, (_, ec) in enumerate(blocks) if i < ec]
+    return blocks, np.array(order, dtype=np.intp)
+
+
+def get_segments(data: Union[str, bytes]) -> List[qrcode.util.QRData]:
+    """Split data in segments, as `qrcode.QRCode.add_data` does by default"""
+    return list(qrcode.util.optimal_data_chunks(data, minimum=20))
+
+
+def get_segment_bits(segment: qrcode.util.QRData) -> Tuple[int, int]:
+    """Return the bits of the content of a segment, as an integer, and their number"""
+    value, length = 0, 0
+    if segment.mode == qrcode.util.MODE_NUMBER:
+        for i in range(0, len(segment.data), 3):
+            chars = segment.data[i:i + 3]
+            bits = qrcode.util.NUMBER_LENGTH[len(chars)]
+            value, length = (value << bits) | int(chars), length + bits
+    elif segment.mode == qrcode.util.MODE_ALPHA_NUM:
+        for i in range(0, len(segment.data), 2):
+            chars = segment.data[i:i + 2]
+            if len(chars) > 1:
+                value = (value << 11) | (qrcode.util.ALPHA_NUM.find(chars[0]) * 45 + qrcode.util.ALPHA_NUM.find(chars[1]))
+                length += 11
+            else:
+                value, length = (value << 6) | qrcode.util.ALPHA_NUM.find(chars), length + 6
+    else:
+        value, length = int.from_bytes(segment.data, 'big'), len(segment.data) * 8
+    return value, length
+
+
+def get_version(segments: Sequence[qrcode.util.QRData], error_correction: int, start: int = 1) -> int:
+    """Return the smallest version, from `start`, which can hold the segments (see `qrcode.QRCode.best_fit`)"""
+    mode_sizes = qrcode.util.mode_sizes_for_version(start)
+    needed_bits = sum(4 + mode_sizes[segment.mode] + get_segment_bits(segment)[1] for segment in segments)
+    version = bisect.bisect_left(qrcode.util.BIT_LIMIT_TABLE[error_correction], needed_bits, start)
+    if version == 41:
+        raise qrcode.exceptions.DataOverflowError()
+    if mode_sizes is not qrcode.util.mode_sizes_for_version(version):
+        return get_version(segments, error_correction, version)
+    return version
+
+
+def get_data_codewords(segments: Sequence[qrcode.util.QRData], version: int, error_correction: int) -> bytes:
+    """Return the data codewords of the segments, terminated and padded (see `qrcode.util.create_data`)"""
+    value, length = 0, 0
+    for segment in segments:
+        bits, bits_length = get_segment_bits(segment)
+        count_length = qrcode.util.length_in_bits(segment.mode, version)
+        value = (((value << 4 | segment.mode) << count_length | len(segment)) << bits_length) | bits
+        length += 4 + count_length + bits_length
+
+    data_count = sum(dc for dc, _ in get_blocks(version, error_correction)[0])
+    if length > data_count * 8:
+        raise qrcode.exceptions.DataOverflowError(
+            f'Code length overflow. Data size ({length}) > size available ({data_count * 8})')
+    padding = min(data_count * 8 - length, 4)  # Terminator
+    padding += -(length + padding) % 8  # Up to the end of the codeword
+    codewords = (value << padding).to_bytes((length + padding) // 8, 'big')
+    pad_count = data_count - len(codewords)
+    return codewords + (bytes([qrcode.util.PAD0, qrcode.util.PAD1]) * (pad_count // 2 + 1))[:pad_count]
+
+
+def get_codewords(data: np.ndarray, version: int, error_correction: int) -> np.ndarray:
+    """
+    Add the error correction codewords to the data codewords, and interleave them (see `qrcode.util.create_bytes`)
+    :param data: the data codewords of QR codes of the same version, one per row
+    :return: the codewords, in the order they are placed, one QR code per row
+    """
+    blocks, order = get_blocks(version, error_correction)
+    data_blocks: List[np.ndarray] = []
+    ec_blocks: List[np.ndarray] = []
+    start = 0
+    for dc, ec in blocks:
+        block = data[:, start:start + dc]
+        data_blocks.append(block)
+        ec_blocks.append(get_error_correction(block, ec))
+        start += dc
+    return np.concatenate(data_blocks + ec_blocks, axis=1)[:, order].astype(np.uint8)
+
+
+def count_runs(lines: np.ndarray) -> np.ndarray:
+    """
+    Score the rule 1 along the last axis: a run of n >= 5 modules of the same color costs n - 2
+    A run of n >= 5 modules holds n - 4 windows of 5 modules of the same color: add 2 by run, at its first window.
+    """
+    same = lines[..., 1:] == lines[..., :-1]
+    windows = same[..., :-3] & same[..., 1:-2] & same[..., 2:-1] & same[..., 3:]
+    starts = windows.copy()
+    starts[..., 1:] &= ~same[..., :-4]
+    return windows.sum(axis=(-2, -1)) + 2 * starts.sum(axis=(-2, -1))
+
+
+def count_finder_like(lines: np.ndarray) -> np.ndarray:
+    """Count the windows matching the patterns of the rule 3 along the last axis"""
+    windows = lines.shape[-1] - 10
+    count = 0
+    for pattern in FINDER_LIKE_PATTERNS:
+        match = lines[..., :windows] == pattern[0]
+        for k in range(1, 11):
+            match &= lines[..., k:k + windows] == pattern[k]
+        count = count + match.sum(axis=(-2, -1))
+    return count
+
+
+def get_penalties(matrices: np.ndarray) -> np.ndarray:
+    """
+    Score masked QR codes as `qrcode.util.lost_point` does
+    :param matrices: the modules, as an array of (..., size, size)
+    :return: the penalty of each QR code, as an array of (...)
+    """
+    size = matrices.shape[-1]
+    columns = matrices.swapaxes(-2, -1)
+    penalty = count_runs(matrices) + count_runs(columns)
+
+    top_left = matrices[..., :-1, :-1]
+    same_right_and_below = (top_left == matrices[..., :-1, 1:]) & (top_left == matrices[..., 1:, :-1])
+    penalty += 3 * (same_right_and_below & (top_left == matrices[..., 1:, 1:])).sum(axis=(-2, -1))
+
+    penalty += 40 * (count_finder_like(matrices) + count_finder_like(columns))
+
+    percent = matrices.sum(axis=(-2, -1)) / float(size ** 2)
+    penalty += 10 * np.floor(np.abs(percent * 100 - 50) / 5).astype(penalty.dtype)
+    return penalty
+
+
+def add_information(matrix: np.ndarray, version: int, error_correction: int, mask: int) -> None:
+    """Write the format (and version) information of a QR code, and its dark module"""
+    size = matrix.shape[-1]
+    bits = qrcode.util.BCH_type_info((error_correction << 3) | mask)
+    for positions in get_format_positions(size):
+        for i, (row, col) in enumerate(positions):
+            matrix[row, col] = (bits >> i) & 1
+    if version >= 7:
+        bits = qrcode.util.BCH_type_number(version)
+        for positions in get_version_positions(size):
+            for i, (row, col) in enumerate(positions):
+                matrix[row, col] = (bits >> i) & 1
+    matrix[size - 8, 8] = True
+
+
+def encode_version(data: np.ndarray, version: int, error_correction: int,
+                   mask: Union[None, int] = None) -> List[MATRIX_TYPE]:
+    """
+    Encode QR codes of the same version
+    :param data: their data codewords, one per row
+    :param version: their version
+    :param error_correction: their error correction level (one of `qrcode.constants.ERROR_CORRECT_*`)
+    :param mask: the mask to use ; the one with the lowest penalty if None
+    :return: the modules of each QR code
+    """
+    modules, rows, cols, masks = get_template(version)
+    bits = np.unpackbits(get_codewords(data, version, error_correction), axis=1).astype(bool)
+    # Remainder bits are light before being masked
+    bits = np.pad(bits, ((0, 0), (0, len(rows) - bits.shape[1])))
+    candidates = masks if mask is None else masks[mask:mask + 1]
+
+    matrices = np.repeat(np.repeat(modules[None, None], len(data), axis=0), len(candidates), axis=1)
+    matrices[:, :, rows, cols] = bits[:, None, :] ^ candidates[None, :, :]
+    best = np.argmin(get_penalties(matrices), axis=1) if mask is None else np.zeros(len(data), dtype=np.intp)
+
+    ret: List[MATRIX_TYPE] = []
+    for matrix, index in zip(matrices, best):
+        matrix = matrix[index]
+        add_information(matrix, version, error_correction, int(index) if mask is None else mask)
+        ret.append(matrix.tolist())
+    return ret
+
+
+def encode_batch(payloads: Sequence[Union[str, bytes]],
+                 error_correction: int = qrcode.constants.ERROR_CORRECT_L, version: Union[None, int] = None,
+                 mask: Union[None, int] = None) -> List[MATRIX_TYPE]:
+    """
+    Encode payloads in QR codes, as `qrcode.QRCode(border=0, ...).add_data(payload)` then `make(fit=True)` do
+    :param payloads: the data to encode
+    :param error_correction: the error correction level (one of `qrcode.constants.ERROR_CORRECT_*`)
+    :param version: the smallest version to use ; the smallest one which fits if None
+    :param mask: the mask to use ; the one with the lowest penalty if None
+    :return: the modules of each QR code, in the same order as the payloads ; `True` is a dark module
+    """
+    by_version: Dict[int, List[Tuple[int, bytes]]] = {}
+    for index, payload in enumerate(payloads):
+        segments = get_segments(payload)
+        payload_version = get_version(segments, error_correction, version or 1)
+        by_version.setdefault(payload_version, []).append(
+            (index, get_data_codewords(segments, payload_version, error_correction)))
+
+    ret: List[Union[None, MATRIX_TYPE]] = [None] * len(payloads)
+    for payload_version, codewords in by_version.items():
+        for start in range(0, len(codewords), BATCH_SIZE):
+            batch = codewords[start:start + BATCH_SIZE]
+            data = np.frombuffer(b''.join(c for _, c in batch), dtype=np.uint8).reshape(len(batch), -1)
+            matrices = encode_version(data.astype(np.int32), payload_version, error_correction, mask)
+            for (index, _), matrix in zip(batch, matrices):
+                ret[index] = matrix
+    return ret
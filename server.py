@@ -0,0 +1,146 @@
+"""
+Long-running HTTP server rendering the cards, with fonts, schema and translations loaded only once
+"""
+import concurrent.futures
+import http.server
+import json
+import threading
+from typing import Any, Dict, Tuple, Union
+
+import click
+import tomlkit
+import tomlkit.exceptions
+
+import batch
+import fontmetrics
+from card import setup
+from config import get_errors, get_validator
+from layout import FONT_FILES
+
+JSON_CONTENT_TYPES: Tuple[str, ...] = ('application/json', 'text/json')
+
+
+class RequestError(Exception):
+    """An error to answer to the client"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def init_worker(settings: Union[None, dict]) -> None:
+    """Set up a worker process, and load the fonts before the first request comes"""
+    setup(settings)
+    for ttf_path in FONT_FILES.values():
+        fontmetrics.get_font_metrics(ttf_path)
+
+
+def parse_config(body: bytes, content_type: str) -> Dict[str, Any]:
+    """
+    Parse and validate a configuration sent by a client
+    :param body: the configuration
+    :param content_type: the content type of the request ; JSON if it is a JSON type, else TOML
+    :return: the configuration, as plain Python objects
+    """
+    try:
+        text = body.decode('utf-8')
+        if content_type.split(';')[0].strip().lower() in JSON_CONTENT_TYPES:
+            config = json.loads(text)
+        else:
+            config = tomlkit.parse(text).unwrap()
+    except (UnicodeDecodeError, ValueError, tomlkit.exceptions.ParseError) as e:
+        raise RequestError(400, f'Configuration cannot be parsed: {e}') from e
+
+    if not get_validator()(config):  # Authoritative, even if jschon cannot tell what is wrong
+        raise RequestError(400, '\n'.join(['Configuration is not valid'] + get_errors(config)))
+    return config
+
+
+class Server(http.server.ThreadingHTTPServer):
+    """
+    HTTP server rendering the configurations POSTed to it.
+    Requests are parsed and validated in the threads of the server, then rendered by a pool of worker processes.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], executor: concurrent.futures.Executor, max_pending: int,
+                 max_size: int):
+        super().__init__(address, RequestHandler)
+        self.executor = executor
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.max_size = max_size
+
+    def render(self, body: bytes, content_type: str) -> bytes:
+        """
+        Render a configuration
+        :param body: the configuration, as sent by the client
+        :param content_type: the content type of the request
+        :return: the PDF
+        """
+        config = parse_config(body, content_type)
+        if not self.pending.acquire(blocking=False):
+            raise RequestError(503, 'Too many pending requests')
+        try:
+            return self.executor.submit(batch.render_shard, list(config.items())).result()
+        except click.ClickException as e:
+            raise RequestError(400, e.message) from e
+        finally:
+            self.pending.release()
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    server: Server
+
+    def send_body(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        try:
+            try:
+                length = int(self.headers.get('Content-Length', ''))
+            except ValueError as e:
+                raise RequestError(411, 'Content-Length is required') from e
+            if length > self.server.max_size:
+                raise RequestError(413, 'Configuration is too large')
+            pdf = self.server.render(self.rfile.read(length), self.headers.get('Content-Type', ''))
+        except RequestError as e:
+            self.send_body(e.status, (e.message + '\n').encode('utf-8'), 'text/plain; charset=utf-8')
+            return
+        except Exception as e:  # The client gets an answer, whatever went wrong
+            self.log_error('Rendering failed: %r', e)
+            self.send_body(500, b'Internal error: the configuration could not be rendered\n', 'text/plain; charset=utf-8')
+            return
+        self.send_body(200, pdf, 'application/pdf')
+
+    def log_message(self, format: str, *args: Any) -> None:
+        click.echo(f'{self.address_string()} - {format % args}', err=True)
+
+
+def serve(host: str, port: int, jobs: int, max_pending: int, max_size: int, settings: Union[None, dict]) -> None:
+    """
+    Serve until interrupted
+    :param host: address to listen to
+    :param port: port to listen to
+    :param jobs: number of worker processes, hence of cards rendered at the same time
+    :param max_pending: number of requests which can be rendered or wait to be ; the next ones are refused
+    :param max_size: maximal size of a configuration, in bytes
+    :param settings: the settings of the `main` group, to set up the worker processes
+    """
+    get_validator()  # Compile the schema before the first request comes
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker,
+            initargs=(settings,)
+    ) as executor:
+        with Server((host, port), executor, max(max_pending, jobs), max_size) as server:
+            click.echo(f'Listening on http://{host}:{server.server_port}/ ; POST a TOML or JSON configuration to get '
+                       f'its PDF.', err=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
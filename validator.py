@@ -0,0 +1,353 @@
+"""
+Fast validation of JSON documents, by compiling the JSON schema into Python closures, or by generating the source of a
+Python module validating it
+
+Only the keywords used by `config.schema` are supported. The compiled validator only says if a document is valid:
+when it is not, ask jschon why.
+"""
+import hashlib
+import inspect
+import json
+import re
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+
+VALIDATOR_TYPE = Callable[[Any], bool]
+
+# Keywords which do not validate anything
+ANNOTATION_KEYWORDS = ('$schema', '$id', '$defs', '$comment', 'title', 'description', 'default', 'examples')
+
+JSON_TYPES: Dict[str, Callable[[Any], bool]] = {
+    'object': lambda x: isinstance(x, Mapping),
+    'array': lambda x: isinstance(x, list),
+    'string': lambda x: isinstance(x, str),
+    'boolean': lambda x: isinstance(x, bool),
+    'integer': lambda x: isinstance(x, int) and not isinstance(x, bool),
+    'number': lambda x: isinstance(x, (int, float)) and not isinstance(x, bool),
+    'null': lambda x: x is None,
+}
+
+
+def json_equals(a: Any, b: Any) -> bool:
+    """Compare 2 JSON values like JSON schema does (`true` is not `1`)"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    return a == b
+
+
+def all_of(validators: List[VALIDATOR_TYPE]) -> VALIDATOR_TYPE:
+    """Return a validator which is valid if all the validators are valid"""
+    if len(validators) == 1:
+        return validators[0]
+    return lambda instance: all(validator(instance) for validator in validators)
+
+
+class SchemaCompiler:
+    """Compile a JSON schema (2020-12, only the keywords used by this project) into a validator."""
+
+    def __init__(self, root: Mapping[str, Any]):
+        self.root = root
+        self.refs: Dict[str, VALIDATOR_TYPE] = {}
+
+    def resolve(self, ref: str) -> Mapping[str, Any]:
+        """Return the subschema a local JSON pointer refers to"""
+        if not ref.startswith('#'):
+            raise NotImplementedError(f'Only local references are supported: {ref}')
+        node = self.root
+        for token in ref[1:].split('/')[1:]:
+            node = node[token.replace('~1', '/').replace('~0', '~')]
+        return node
+
+    def compile_ref(self, ref: str) -> VALIDATOR_TYPE:
+        """Compile a reference only once, even if the schema is recursive."""
+        if ref not in self.refs:
+            self.refs[ref] = lambda instance: compiled(instance)
+            compiled = self.compile(self.resolve(ref))
+            self.refs[ref] = compiled
+        return self.refs[ref]
+
+    def compile(self, schema: Any) -> VALIDATOR_TYPE:
+        """
+        Compile a (sub)schema
+        :param schema: the schema
+        :return: a function returning whether an instance is valid
+        """
+        if schema is True:
+            return lambda instance: True
+        if schema is False:
+            return lambda instance: False
+
+        validators: List[VALIDATOR_TYPE] = []
+        for keyword, value in schema.items():
+            if keyword in ANNOTATION_KEYWORDS or keyword == 'additionalProperties':
+                continue
+            compile_keyword = getattr(self, 'keyword_' + keyword.lstrip('$'), None)
+            if compile_keyword is None:
+                raise NotImplementedError(f'Unsupported keyword: {keyword}')
+            validators.append(compile_keyword(value, schema))
+
+        if 'additionalProperties' in schema:
+            validators.append(self.keyword_additionalProperties(schema['additionalProperties'], schema))
+
+        if not validators:
+            return lambda instance: True
+        return all_of(validators)
+
+    def keyword_ref(self, ref: str, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return self.compile_ref(ref)
+
+    @staticmethod
+    def keyword_type(types: Any, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        if isinstance(types, str):
+            return JSON_TYPES[types]
+        checks = [JSON_TYPES[t] for t in types]
+        return lambda instance: any(check(instance) for check in checks)
+
+    @staticmethod
+    def keyword_const(const: Any, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return lambda instance: json_equals(instance, const)
+
+    @staticmethod
+    def keyword_enum(values: List[Any], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return lambda instance: any(json_equals(instance, value) for value in values)
+
+    @staticmethod
+    def keyword_minLength(length: int, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return lambda instance: not isinstance(instance, str) or len(instance) >= length
+
+    @staticmethod
+    def keyword_maxLength(length: int, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return lambda instance: not isinstance(instance, str) or len(instance) <= length
+
+    @staticmethod
+    def keyword_required(names: List[str], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return lambda instance: not isinstance(instance, Mapping) or all(name in instance for name in names)
+
+    def keyword_properties(self, properties: Mapping[str, Any], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        compiled = {name: self.compile(subschema) for name, subschema in properties.items()}
+
+        def validate(instance: Any) -> bool:
+            if not isinstance(instance, Mapping):
+                return True
+            for name, validator in compiled.items():
+                if name in instance and not validator(instance[name]):
+                    return False
+            return True
+        return validate
+
+    def keyword_additionalProperties(self, subschema: Any, schema: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        known = frozenset(schema.get('properties', {}))
+        if subschema is False:
+            return lambda instance: not isinstance(instance, Mapping) or known.issuperset(instance)
+        compiled = self.compile(subschema)
+        return lambda instance: not isinstance(instance, Mapping) or all(
+            compiled(value) for name, value in instance.items() if name not in known
+        )
+
+    def keyword_allOf(self, subschemas: List[Any], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        return all_of([self.compile(subschema) for subschema in subschemas])
+
+    def keyword_anyOf(self, subschemas: List[Any], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        compiled = [self.compile(subschema) for subschema in subschemas]
+        return lambda instance: any(validator(instance) for validator in compiled)
+
+    def keyword_oneOf(self, subschemas: List[Any], _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        compiled = [self.compile(subschema) for subschema in subschemas]
+        return lambda instance: sum(1 for validator in compiled if validator(instance)) == 1
+
+    def keyword_not(self, subschema: Any, _: Mapping[str, Any]) -> VALIDATOR_TYPE:
+        compiled = self.compile(subschema)
+        return lambda instance: not compiled(instance)
+
+
+def compile_schema(schema: Mapping[str, Any], pointer: str = '#') -> VALIDATOR_TYPE:
+    """
+    Compile a JSON schema
+    :param schema: the whole JSON schema
+    :param pointer: the JSON pointer to the subschema to compile, from the root of the schema
+    :return: a function returning whether an instance is valid
+    """
+    return SchemaCompiler(schema).compile_ref(pointer)
+
+
+def compile_schema_file(path: str, pointer: str = '#') -> VALIDATOR_TYPE:
+    """Compile a JSON schema from a file (see `compile_schema`)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_schema(json.load(f), pointer)
+
+
+class SchemaCodeGenerator:
+    """
+    Generate the source of a Python module validating a JSON schema (2020-12, the same keywords as `SchemaCompiler`).
+    Each referenced subschema is a function of the module, and the others are inlined in it as plain expressions: no
+    closure is called, and nothing is imported.
+    """
+
+    def __init__(self, root: Mapping[str, Any]):
+        self.root = root
+        self.functions: Dict[str, str] = {}  # Source of the functions, by JSON pointer
+        self.names: Dict[str, str] = {}  # Name of the functions, by JSON pointer
+        self.constants: List[str] = []  # Source of the module constants
+        self.depth = 0  # Of the nested loops, to name their variables
+        self.types: Dict[str, str] = {}  # Type already checked, by expression of the instance
+
+    def guard(self, json_type: str, var: str, expression: str) -> str:
+        """Apply an expression only to the instances of a type, as keywords do, unless it is already checked"""
+        if self.types.get(var) == json_type:
+            return expression
+        checks = {'object': f'isinstance({var}, Mapping)', 'string': f'isinstance({var}, str)'}
+        return f'(not {checks[json_type]} or {expression})'
+
+    @staticmethod
+    def function_name(ref: str) -> str:
+        """Name the function validating a JSON pointer: `validate` for the root, `validate_defs_wifi` for `#/$defs/wifi`"""
+        return '_'.join(['validate'] + [re.sub(r'\W+', '_', token).strip('_') for token in ref[1:].split('/')[1:]])
+
+    def generate_ref(self, ref: str) -> str:
+        """Generate the function of a JSON pointer only once, even if the schema is recursive ; return its name."""
+        if ref not in self.names:
+            self.names[ref] = self.function_name(ref)
+            self.functions[ref] = ''  # Reserve its place: functions are in the order they are referenced
+            expression = self.generate(SchemaCompiler(self.root).resolve(ref), 'instance')
+            self.functions[ref] = (f'def {self.names[ref]}(instance: Any) -> bool:\n'
+                                   f'    """Whether an instance is valid against `{ref}`"""\n'
+                                   f'    return {expression}\n')
+        return self.names[ref]
+
+    def add_names(self, names: Sequence[str]) -> str:
+        """Add a constant set of names to the module (sorted, for the module to be reproducible) ; return its name"""
+        name = f'_NAMES_{len(self.constants)}'
+        self.constants.append(f'{name} = frozenset({sorted(names)!r})')
+        return name
+
+    def generate(self, schema: Any, var: str) -> str:
+        """
+        Generate the expression validating a (sub)schema
+        :param schema: the schema
+        :param var: the expression of the instance to validate
+        :return: a Python expression, True if the instance is valid
+        """
+        if schema is True:
+            return 'True'
+        if schema is False:
+            return 'False'
+
+        expressions: List[str] = []
+        previous_type = self.types.get(var)
+        for keyword, value in schema.items():
+            if keyword in ANNOTATION_KEYWORDS:
+                continue
+            generate_keyword = getattr(self, 'keyword_' + keyword.lstrip('$'), None)
+            if generate_keyword is None:
+                raise NotImplementedError(f'Unsupported keyword: {keyword}')
+            expressions.append(generate_keyword(value, schema, var))
+            if keyword == 'type' and isinstance(value, str):
+                self.types[var] = value  # Checked first: the next keywords can skip it
+        self.types.pop(var, None)
+        if previous_type is not None:
+            self.types[var] = previous_type
+
+        if not expressions:
+            return 'True'
+        if len(expressions) == 1:
+            return expressions[0]
+        return '(' + ' and '.join(expressions) + ')'
+
+    def keyword_ref(self, ref: str, _: Mapping[str, Any], var: str) -> str:
+        return f'{self.generate_ref(ref)}({var})'
+
+    @staticmethod
+    def keyword_type(types: Any, _: Mapping[str, Any], var: str) -> str:
+        checks = {
+            'object': f'isinstance({var}, Mapping)',
+            'array': f'isinstance({var}, list)',
+            'string': f'isinstance({var}, str)',
+            'boolean': f'isinstance({var}, bool)',
+            'integer': f'(isinstance({var}, int) and not isinstance({var}, bool))',
+            'number': f'(isinstance({var}, (int, float)) and not isinstance({var}, bool))',
+            'null': f'{var} is None',
+        }
+        if isinstance(types, str):
+            return checks[types]
+        return '(' + ' or '.join(checks[t] for t in types) + ')'
+
+    @staticmethod
+    def keyword_const(const: Any, _: Mapping[str, Any], var: str) -> str:
+        if isinstance(const, str):
+            return f'{var} == {const!r}'  # Only a string equals a string
+        if isinstance(const, bool) or const is None:
+            return f'{var} is {const!r}'
+        return f'_json_equals({var}, {const!r})'
+
+    def keyword_enum(self, values: List[Any], schema: Mapping[str, Any], var: str) -> str:
+        return '(' + ' or '.join(self.keyword_const(value, schema, var) for value in values) + ')'
+
+    def keyword_minLength(self, length: int, _: Mapping[str, Any], var: str) -> str:
+        return self.guard('string', var, f'len({var}) >= {length!r}')
+
+    def keyword_maxLength(self, length: int, _: Mapping[str, Any], var: str) -> str:
+        return self.guard('string', var, f'len({var}) <= {length!r}')
+
+    def keyword_required(self, names: List[str], _: Mapping[str, Any], var: str) -> str:
+        return self.guard('object', var, '(' + ' and '.join(f'{name!r} in {var}' for name in names) + ')')
+
+    def keyword_properties(self, properties: Mapping[str, Any], _: Mapping[str, Any], var: str) -> str:
+        checks = [
+            f'({name!r} not in {var} or {self.generate(subschema, f"{var}[{name!r}]")})'
+            for name, subschema in properties.items()
+        ]
+        if not checks:
+            return 'True'
+        return self.guard('object', var, '(' + ' and '.join(checks) + ')')
+
+    def keyword_additionalProperties(self, subschema: Any, schema: Mapping[str, Any], var: str) -> str:
+        known = list(schema.get('properties', {}))
+        if subschema is False:
+            return self.guard('object', var, f'{self.add_names(known)}.issuperset({var})')
+
+        self.depth += 1
+        name, value = f'name{self.depth}', f'value{self.depth}'
+        check = self.generate(subschema, value)
+        self.depth -= 1
+        condition = f' if {name} not in {self.add_names(known)}' if known else ''
+        return self.guard('object', var, f'all({check} for {name}, {value} in {var}.items(){condition})')
+
+    def keyword_allOf(self, subschemas: List[Any], _: Mapping[str, Any], var: str) -> str:
+        return '(' + ' and '.join(self.generate(subschema, var) for subschema in subschemas) + ')'
+
+    def keyword_anyOf(self, subschemas: List[Any], _: Mapping[str, Any], var: str) -> str:
+        return '(' + ' or '.join(self.generate(subschema, var) for subschema in subschemas) + ')'
+
+    def keyword_oneOf(self, subschemas: List[Any], _: Mapping[str, Any], var: str) -> str:
+        return '(sum((' + ', '.join(self.generate(subschema, var) for subschema in subschemas) + ',)) == 1)'
+
+    def keyword_not(self, subschema: Any, _: Mapping[str, Any], var: str) -> str:
+        return f'not {self.generate(subschema, var)}'
+
+
+def generate_module(schema_text: str, pointers: Sequence[str] = ('#',), source: str = 'the schema') -> str:
+    """
+    Generate the source of a Python module validating a JSON schema (see `SchemaCodeGenerator`)
+    :param schema_text: the JSON schema, as written in its file
+    :param pointers: the JSON pointers of the subschemas to validate ; each one gets a function (see
+    `SchemaCodeGenerator.function_name`)
+    :param source: how to name the schema in the docstring of the module
+    :return: the source of the module ; its `SCHEMA_SHA256` is the hash of `schema_text` (see `schema_digest`)
+    """
+    generator = SchemaCodeGenerator(json.loads(schema_text))
+    for pointer in pointers:
+        generator.generate_ref(pointer)
+    functions = list(generator.functions.values())
+    if any('_json_equals(' in function for function in functions):
+        functions.insert(0, inspect.getsource(json_equals).replace('def json_equals', 'def _json_equals'))
+
+    return '\n\n'.join([
+        f'"""\nValidator of {source}, generated by `make.py validator`: do not edit.\n\n'
+        f'It only says if a document is valid: when it is not, ask jschon why.\n"""\n'
+        f'from typing import Any, Mapping\n\n'
+        f'SCHEMA_SHA256 = {schema_digest(schema_text)!r}\n' + ''.join(f'{c}\n' for c in generator.constants),
+    ] + functions)
+
+
+def schema_digest(schema_text: str) -> str:
+    """Hash a schema, to know if a generated module is still up to date"""
+    return hashlib.sha256(schema_text.encode('utf-8')).hexdigest()
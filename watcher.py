@@ -0,0 +1,173 @@
+"""
+Long-running generation of a PDF, regenerated each time its configuration is saved
+
+Fonts, schema, translations, QR codes and cards are kept from one generation to the next: only the networks which
+changed are rendered again (see `pagecache.MemoryPageCache`).
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from typing import Set, Tuple, Union
+
+import click
+
+import card
+from card import Renderer, get_renderer, setup
+from config import iter_config_from_file
+from myhack import open_atomic
+
+SIGNATURE_TYPE = Tuple[int, int, int]  # inode, size, modification time
+# See inotify(7)
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+def get_signature(path: str) -> Union[None, SIGNATURE_TYPE]:
+    """Return what changes when a file is saved ; None if it does not exist (e.g. while an editor replaces it)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class PollingWatcher:
+    """Wait for changes in a directory by waking up regularly"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def wait(self, timeout: Union[None, float] = None) -> None:
+        """Return when something may have changed, or after the timeout (None: no timeout)"""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Wait for changes in a directory with inotify (Linux only)"""
+
+    def __init__(self, directory: str):
+        """:raise OSError: if inotify cannot be used"""
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'Cannot use inotify')
+        # The directory, not the file: editors often save by replacing the file
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'Cannot watch {directory}')
+
+    def wait(self, timeout: Union[None, float] = None) -> None:
+        """Return when something changed in the directory, or after the timeout (None: no timeout)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 64 * 1024):  # The events do not matter: the file is compared
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def get_watcher(directory: str, interval: float) -> Union[InotifyWatcher, PollingWatcher]:
+    """Return an inotify watcher of a directory if it can, a polling one otherwise"""
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError):  # AttributeError: a libc without inotify
+        click.echo(f'Cannot use inotify: polling every {interval}s.', err=True)
+        return PollingWatcher(interval)
+
+
+def wait_for_save(watcher: Union[InotifyWatcher, PollingWatcher], path: str, signature: Union[None, SIGNATURE_TYPE],
+                  debounce: float) -> SIGNATURE_TYPE:
+    """
+    Wait for a file to be saved, and to stay the same for a while (an editor can write it in several times)
+    :param watcher: the watcher of the directory of the file
+    :param path: the file
+    :param signature: its signature when it was last read
+    :param debounce: how long, in seconds, the file has to stay the same
+    :return: its new signature
+    """
+    while True:
+        watcher.wait()
+        current = get_signature(path)
+        if current is not None and current != signature:
+            break
+    while True:
+        watcher.wait(debounce)
+        previous, current = current, get_signature(path)
+        if current is not None and current == previous:
+            return current
+
+
+def generate(config: str, config_format: Union[None, str], output: str, renderer: Renderer,
+             previous_keys: Set[str]) -> Set[str]:
+    """
+    Generate the PDF of a configuration, rendering only the networks which are not in the page cache of the renderer
+    :param config: path of the configuration
+    :param config_format: one of `config.CONFIG_FORMATS` ; guessed from the file name if None
+    :param output: path of the PDF to write ; it is only replaced once the PDF is complete
+    :param renderer: the renderer, keeping the cards in memory
+    :param previous_keys: the keys of the cards of the previous generation
+    :return: the keys of the cards of this generation
+    """
+    with open(config, 'r', encoding='utf-8') as config_IO:
+        networks = list(iter_config_from_file(config_IO, config_format))
+    keys = [renderer.page_cache.get_key(name, wifi) for name, wifi in networks]
+
+    with open_atomic(output) as stream:  # On errors, the previous PDF is kept
+        card.build_pdf(networks, stream, renderer).output(stream)
+    renderer.page_cache.keep(keys)
+    changed = len(set(keys) - previous_keys)
+    click.echo(f'{output}: {len(keys)} card(s), {changed} new or changed.', err=True)
+    return set(keys)
+
+
+def watch(config: str, config_format: Union[None, str], output: str, interval: float, debounce: float,
+          settings: dict) -> None:
+    """
+    Generate the PDF of a configuration, then generate it again each time the configuration is saved, until
+    interrupted
+    :param config: path of the configuration
+    :param config_format: one of `config.CONFIG_FORMATS` ; guessed from the file name if None
+    :param output: path of the PDF to write
+    :param interval: seconds between two checks of the configuration, if inotify cannot be used
+    :param debounce: seconds the configuration has to stay the same before being read
+    :param settings: the settings of the `main` group (and of the command)
+    """
+    setup(dict(settings, keep_pages=True))
+    renderer = get_renderer()
+    watcher = get_watcher(os.path.dirname(os.path.abspath(config)), interval)
+    keys: Set[str] = set()
+    signature = get_signature(config)
+    try:
+        while True:
+            try:
+                keys = generate(config, config_format, output, renderer, keys)
+            except click.ClickException as e:  # Keep watching: the next save may fix it
+                e.show()
+            except ValueError as e:  # Including the parse errors of tomlkit
+                click.echo(f'Error: configuration cannot be parsed: {e}', err=True)
+            except OSError as e:
+                click.echo(f'Error: cannot generate the PDF: {e}', err=True)
+            click.echo(f'Waiting for {config} to be saved (Ctrl+C to stop)...', err=True)
+            signature = wait_for_save(watcher, config, signature, debounce)
+    finally:
+        watcher.close()
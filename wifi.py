@@ -0,0 +1,58 @@
+"""
+Characteristics of Wi-Fi networks
+"""
+import aenum
+
+import myhack
+
+
+class WifiSecurity(aenum.NamedConstant):
+    """Select Wi-Fi security to use"""
+    OPEN = 'Open'
+    ENHANCED_OPEN = 'Enhanced Open'  # FYI : The kind of "Open" which comes with WPA3. It enables the encryption :D
+    WEP = 'WEP'
+    WPA = 'WPA Personal'
+    WPA2PSK = 'WPA2 Personal'
+    WPA2 = WPA2PSK
+    WPA3PSK = 'WPA3 Personal'
+    WPA3 = WPA3PSK
+
+    @property
+    def name(self):
+        return self._name_
+
+    @property
+    def value(self):
+        return self._value_
+
+    @property
+    def is_open(self):
+        return self in [WifiSecurity.OPEN, WifiSecurity.ENHANCED_OPEN]
+
+    @property
+    def label(self):
+        """How the security is written in a configuration (see `config.schema`)"""
+        return {
+            'OPEN': 'Open',
+            'ENHANCED_OPEN': 'Enhanced Open',
+            'WEP': 'WEP',
+            'WPA': 'WPA',
+            'WPA2PSK': 'WPA2-PSK',
+            'WPA2': 'WPA2-PSK',
+            'WPA3PSK': 'WPA3-PSK',
+            'WPA3': 'WPA3-PSK',
+        }[self.name]
+
+    @classmethod
+    def from_string(cls, label: str):
+        return cls._members_[label.upper().replace('-', '').replace(' ', '_')]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, type(self)):
+            other = other.value
+        return self.value == other
+
+    @classmethod
+    @myhack.run_once
+    def list(cls):
+        return list(map(lambda x: x.name, cls))